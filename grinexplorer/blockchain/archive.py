@@ -0,0 +1,41 @@
+import bz2
+import gzip
+import json
+import lzma
+
+# Block archives are NDJSON files holding one `get_block` response per line,
+# compressed according to their file extension.
+OPENERS = {
+    ".gz": gzip.open,
+    ".bz2": bz2.open,
+    ".xz": lzma.open,
+}
+
+
+def open_archive(path, mode="rt"):
+    for (extension, opener) in OPENERS.items():
+        if path.endswith(extension):
+            return opener(path, mode)
+
+    return open(path, mode)
+
+
+def read_archive(path):
+    # yields the blocks of the archive one at a time, so memory use doesn't
+    # depend on its size
+    with open_archive(path, "rt") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+class ArchiveWriter:
+    def __init__(self, path):
+        self.file = open_archive(path, "wt")
+
+    def write(self, block_data):
+        self.file.write(json.dumps(block_data, separators=(",", ":")))
+        self.file.write("\n")
+
+    def close(self):
+        self.file.close()
@@ -0,0 +1,71 @@
+import re
+
+from django.db import models
+
+HEX_RE = re.compile(r"[0-9a-fA-F]*")
+
+
+def is_hex(value, prefix=False):
+    # whether `value` can be stored in a HexField, or used as a prefix for
+    # `startswith` lookups on one (which may have an odd length)
+    return bool(HEX_RE.fullmatch(value)) and (prefix or len(value) % 2 == 0)
+
+
+def prefix_range(prefix):
+    # Returns the (lower, upper) bounds of the byte strings starting with the
+    # hex `prefix`, the upper one being exclusive and None if there is none
+    lower = bytes.fromhex(prefix + "0" * (len(prefix) % 2))
+    highest = bytearray.fromhex(prefix + "f" * (len(prefix) % 2))
+
+    while highest and highest[-1] == 0xff:
+        highest.pop()
+    if not highest:
+        return (lower, None)
+
+    highest[-1] += 1
+    return (lower, bytes(highest))
+
+
+class HexField(models.Field):
+    """
+    Binary data, such as hashes and commitments, that's exposed as a hex
+    string but stored as `bytea`, which takes half the space of the hex
+    string in the table and in its indexes.
+    """
+
+    description = "Binary data as hex string"
+
+    def db_type(self, connection):
+        return "bytea"
+
+    def from_db_value(self, value, expression, connection):
+        if value is None:
+            return value
+        return bytes(value).hex()
+
+    def to_python(self, value):
+        if isinstance(value, (bytes, memoryview)):
+            return bytes(value).hex()
+        return value
+
+    def get_prep_value(self, value):
+        value = super().get_prep_value(value)
+        if value is None or isinstance(value, bytes):
+            return value
+        return bytes.fromhex(value)
+
+
+@HexField.register_lookup
+class HexStartsWith(models.Lookup):
+    # `field__startswith="abc"` as a range query, which can use the field's
+    # index unlike LIKE
+    lookup_name = "startswith"
+    prepare_rhs = False
+
+    def as_sql(self, compiler, connection):
+        (lhs, params) = self.process_lhs(compiler, connection)
+        (lower, upper) = prefix_range(self.rhs)
+
+        if upper is None:
+            return ("%s >= %%s" % lhs, params + [lower])
+        return ("%s >= %%s AND %s < %%s" % (lhs, lhs), params + [lower] + params + [upper])
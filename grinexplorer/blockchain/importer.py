@@ -0,0 +1,370 @@
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.db import connection, transaction
+from django.utils.dateparse import parse_datetime
+from psycopg2.extras import execute_values
+
+from blockchain.models import Block, Input, Output, OutputProof, Kernel, block_difficulty
+from blockchain.signals import blocks_stored, notify_blocks_stored
+
+# upper bound for the number of rows sent in a single INSERT, which keeps
+# busy batches well below PostgreSQL's limit on query parameters
+INSERT_BATCH_SIZE = 1000
+
+# links outputs to the block of the input spending them; `{}` is replaced by
+# a condition selecting the inputs or outputs to look at. A commitment can be
+# created again once spent, so an output is spent by the first input after
+# it, unless the commitment is created again before that input. As blocks are
+# stored in any order, an output linked to a later input is linked again
+# once an earlier one is stored.
+SPENT_OUTPUTS_SQL = (
+    "UPDATE blockchain_output AS o "
+    "SET spent = TRUE, spent_block_id = b.hash, spent_height = b.height "
+    "FROM blockchain_block AS ob, "
+    "blockchain_input AS i JOIN blockchain_block AS b ON b.hash = i.block_id "
+    "WHERE ob.hash = o.block_id AND o.commit = i.data AND b.height > ob.height "
+    "AND (o.spent_height IS NULL OR o.spent_height > b.height) "
+    "AND NOT EXISTS ("
+    "SELECT 1 FROM blockchain_input AS e JOIN blockchain_block AS eb ON eb.hash = e.block_id "
+    "WHERE e.data = o.commit AND eb.height > ob.height AND eb.height < b.height"
+    ") AND NOT EXISTS ("
+    "SELECT 1 FROM blockchain_output AS r JOIN blockchain_block AS rb ON rb.hash = r.block_id "
+    "WHERE r.commit = o.commit AND rb.height > ob.height AND rb.height < b.height"
+    ") AND {}"
+)
+
+
+# sets the target difficulty of blocks from their previous block's total
+# difficulty; `{}` is replaced by a condition selecting the blocks
+TARGET_DIFFICULTY_SQL = (
+    "UPDATE blockchain_block AS b "
+    "SET target_difficulty = b.total_difficulty - p.total_difficulty "
+    "FROM blockchain_block AS p "
+    "WHERE p.hash = b.previous_id AND {}"
+)
+
+
+# recomputes the daily stats of the days between two dates
+DAILY_STATS_SQL = (
+    "INSERT INTO blockchain_dailystats "
+    "(date, blocks, max_total_difficulty, fees, kernels, inputs, outputs, block_interval) "
+    "SELECT date(DATE_TRUNC('day', timestamp)) AS date, count(hash), max(total_difficulty), "
+    "sum(fee_total), sum(kernel_count), sum(input_count), sum(output_count), "
+    "extract(epoch from max(timestamp) - min(timestamp)) / nullif(count(hash) - 1, 0) "
+    "FROM blockchain_block "
+    "WHERE timestamp >= %s AND timestamp < %s "
+    "GROUP BY DATE_TRUNC('day', timestamp) "
+    "ON CONFLICT (date) DO UPDATE SET "
+    "blocks = EXCLUDED.blocks, max_total_difficulty = EXCLUDED.max_total_difficulty, "
+    "fees = EXCLUDED.fees, kernels = EXCLUDED.kernels, inputs = EXCLUDED.inputs, "
+    "outputs = EXCLUDED.outputs, block_interval = EXCLUDED.block_interval"
+)
+
+
+def update_daily_stats(first, last):
+    # Recomputes the daily stats of the days from the datetime `first` to
+    # the datetime `last`. This only aggregates the blocks of these days.
+    with connection.cursor() as cursor:
+        cursor.execute(DAILY_STATS_SQL, [first.date(), last.date() + timedelta(days=1)])
+
+
+def link_spent_outputs(hashes):
+    # Marks the outputs spent by the inputs of the blocks `hashes` as spent,
+    # as well as the outputs of these blocks which are spent by an input
+    # that's stored already (the chain is usually imported backwards).
+    hashes = [bytes.fromhex(hash) for hash in hashes]
+    with connection.cursor() as cursor:
+        cursor.execute(SPENT_OUTPUTS_SQL.format("i.block_id = ANY(%s)"), [hashes])
+        cursor.execute(SPENT_OUTPUTS_SQL.format("o.block_id = ANY(%s)"), [hashes])
+
+
+def common_ancestor(a, b):
+    # Returns the hash of the last block the stored chains ending at the
+    # blocks `a` and `b` have in common, walking back along `previous` one
+    # block at a time, as reorgs are short. None if either chain isn't stored
+    # and linked down to it.
+    heights = dict(Block.objects.filter(hash__in=[a, b]).values_list("hash", "height"))
+    if a not in heights or b not in heights:
+        return None
+
+    (height_a, height_b) = (heights[a], heights[b])
+    while a != b:
+        if height_a >= height_b:
+            a = Block.objects.filter(hash=a).values_list("previous_id", flat=True).first()
+            height_a -= 1
+        else:
+            b = Block.objects.filter(hash=b).values_list("previous_id", flat=True).first()
+            height_b -= 1
+
+        if a is None or b is None:
+            return None
+
+    return a
+
+
+def chunked(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+
+    if chunk:
+        yield chunk
+
+
+class BlockPipeline:
+    """
+    Fetches blocks on a pool of worker threads while the consumer is busy
+    storing the previous ones.
+
+    `keys` (heights or hashes) are grouped into chunks of `chunk_size`, and
+    `fetch` is called with each chunk and has to return the blocks for it,
+    e.g. using a single batched RPC request. The blocks are yielded in the
+    same order as `keys`, no matter in which order the workers finish. About
+    `queue_depth` fetched blocks wait for the consumer at most; the workers
+    pause once the queue is full.
+    """
+
+    def __init__(self, fetch, keys, workers=4, queue_depth=32, chunk_size=1):
+        self.fetch = fetch
+        self.keys = keys
+        self.workers = workers
+        self.chunk_size = max(chunk_size, 1)
+        self.queue = queue.Queue(maxsize=max(queue_depth // self.chunk_size, 1))
+        self.stopped = threading.Event()
+
+    def _put(self, item):
+        while not self.stopped.is_set():
+            try:
+                self.queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+
+        return False
+
+    def _produce(self, executor):
+        for chunk in chunked(self.keys, self.chunk_size):
+            future = executor.submit(self.fetch, chunk)
+
+            if not self._put(future):
+                future.cancel()
+                return
+
+        self._put(None)
+
+    def __iter__(self):
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            producer = threading.Thread(target=self._produce, args=(executor,))
+            producer.start()
+
+            try:
+                while True:
+                    future = self.queue.get()
+                    if future is None:
+                        return
+
+                    yield from future.result()
+            finally:
+                # the consumer is done (or gave up early), so drop everything
+                # that has been fetched ahead but not consumed yet
+                self.stopped.set()
+                producer.join()
+
+                while not self.queue.empty():
+                    future = self.queue.get_nowait()
+                    if future is not None:
+                        future.cancel()
+
+
+class BlockWriter:
+    """
+    Stores blocks `batch_size` at a time.
+
+    Each batch is written in a single transaction: one bulk INSERT for the
+    blocks and one each for their inputs, outputs, output proofs and
+    kernels, after which the spent outputs are linked to the spending blocks
+    and the daily stats of the batch's days are updated. `previous` (and
+    `target_difficulty`, which depends on it) is set right away if the
+    previous block is part of the same batch or already stored; the
+    remaining links are kept in `unlinked` and stored with a single UPDATE
+    as soon as their previous block is written. Call `flush()`
+    once done to store the remaining blocks.
+
+    If `checkpoint` is set to an `ImportCheckpoint`, it's saved with the next
+    batch, recording how far the import got.
+    """
+
+    def __init__(self, batch_size=100, stdout=None):
+        self.batch_size = batch_size
+        self.stdout = stdout
+        self.blocks = {}
+        self.checkpoint = None
+        # hash -> previous hash of the stored blocks whose previous block
+        # hasn't been stored yet
+        self.unlinked = {}
+
+    def log(self, msg):
+        if self.stdout is not None:
+            self.stdout.write(msg)
+
+    def existing(self, hashes):
+        # returns those of `hashes` which are stored or about to be stored,
+        # using a single query
+        hashes = set(hashes)
+        found = hashes & self.blocks.keys()
+
+        if hashes - found:
+            found.update(
+                Block.objects.filter(hash__in=hashes - found)
+                             .values_list("hash", flat=True))
+
+        return found
+
+    def add(self, block_data):
+        self.blocks[block_data["header"]["hash"]] = block_data
+
+        if len(self.blocks) >= self.batch_size:
+            self.flush()
+
+    def link(self, hash, previous):
+        # mark `previous` as the previous block of `hash`, which is stored
+        # once both blocks exist
+        self.unlinked[hash] = previous
+
+    def flush(self):
+        blocks, self.blocks = self.blocks, {}
+
+        previous = {block_data["header"]["previous"] for block_data in blocks.values()}
+        previous.update(self.unlinked.values())
+        known = self.existing(previous - blocks.keys()) | blocks.keys()
+
+        links = {
+            hash: prev
+            for (hash, prev) in self.unlinked.items()
+            if prev in known
+        }
+        for hash in links:
+            del self.unlinked[hash]
+
+        with transaction.atomic():
+            self._insert(blocks, known)
+            self._link(links)
+
+            if blocks:
+                link_spent_outputs(list(blocks.keys()))
+                notify_blocks_stored(list(blocks.keys()))
+
+                timestamps = [
+                    parse_datetime(block_data["header"]["timestamp"])
+                    for block_data in blocks.values()
+                ]
+                update_daily_stats(min(timestamps), max(timestamps))
+
+            if self.checkpoint is not None:
+                self.checkpoint.save()
+
+        for block_data in blocks.values():
+            self.log("Stored block {} @ {}".format(
+                block_data["header"]["hash"], block_data["header"]["height"]))
+
+        if blocks:
+            blocks_stored.send(sender=self.__class__, hashes=list(blocks.keys()))
+
+    def _insert(self, blocks, known):
+        if not blocks:
+            return
+
+        new_blocks = []
+        inputs = []
+        outputs = []
+        proofs = []
+        kernels = []
+        # blocks whose previous block was stored before this batch
+        stored_previous = []
+        for block_data in blocks.values():
+            header = dict(block_data["header"])
+            previous = header.pop("previous")
+            target_difficulty = None
+
+            if previous in blocks:
+                target_difficulty = header["total_difficulty"] - \
+                    blocks[previous]["header"]["total_difficulty"]
+            elif previous in known:
+                stored_previous.append(header["hash"])
+            else:
+                # usually the previous block is stored after this one, this
+                # link is stored together with it
+                self.unlinked[header["hash"]] = previous
+                previous = None
+
+            block = Block(
+                previous_id=previous,
+                difficulty=block_difficulty(
+                    header["hash"], header["edge_bits"], header["secondary_scaling"]),
+                target_difficulty=target_difficulty,
+                input_count=len(block_data["inputs"]),
+                output_count=len(block_data["outputs"]),
+                kernel_count=len(block_data["kernels"]),
+                fee_total=sum(kernel_data["fee"] for kernel_data in block_data["kernels"]),
+                **header,
+            )
+            new_blocks.append(block)
+
+            inputs.extend(
+                Input(block=block, data=input_data)
+                for input_data in block_data["inputs"])
+            for output_data in block_data["outputs"]:
+                output_data = dict(output_data)
+                proof = output_data.pop("proof", None)
+                merkle_proof = output_data.pop("merkle_proof", None)
+
+                output = Output(block=block, **output_data)
+                outputs.append(output)
+                if proof is not None or merkle_proof is not None:
+                    proofs.append(OutputProof(
+                        output=output, proof=proof, merkle_proof=merkle_proof))
+            kernels.extend(
+                Kernel(block=block, **kernel_data)
+                for kernel_data in block_data["kernels"])
+
+        Block.objects.bulk_create(new_blocks, batch_size=INSERT_BATCH_SIZE)
+        Input.objects.bulk_create(inputs, batch_size=INSERT_BATCH_SIZE)
+        Output.objects.bulk_create(outputs, batch_size=INSERT_BATCH_SIZE)
+        # the outputs only got their ids from bulk_create
+        for proof in proofs:
+            proof.output_id = proof.output.pk
+        OutputProof.objects.bulk_create(proofs, batch_size=INSERT_BATCH_SIZE)
+        Kernel.objects.bulk_create(kernels, batch_size=INSERT_BATCH_SIZE)
+
+        if stored_previous:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    TARGET_DIFFICULTY_SQL.format("b.hash = ANY(%s)"),
+                    [[bytes.fromhex(hash) for hash in stored_previous]])
+
+    def _link(self, links):
+        if not links:
+            return
+
+        with connection.cursor() as cursor:
+            execute_values(
+                cursor,
+                "UPDATE blockchain_block AS b SET previous_id = p.hash, "
+                "target_difficulty = b.total_difficulty - p.total_difficulty "
+                "FROM (VALUES %s) AS v (hash, previous) "
+                "JOIN blockchain_block AS p ON p.hash = v.previous "
+                "WHERE b.hash = v.hash AND b.previous_id IS NULL",
+                [
+                    (bytes.fromhex(hash), bytes.fromhex(previous))
+                    for (hash, previous) in links.items()
+                ],
+                page_size=INSERT_BATCH_SIZE,
+            )
+
+        self.log("  Linked {} blocks to their previous block".format(len(links)))
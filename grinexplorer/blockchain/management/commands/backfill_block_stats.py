@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Max
+
+from blockchain.models import Block
+
+
+class Command(BaseCommand):
+    help = "Fill in the input, output and kernel counts and fee totals of the stored blocks"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Number of heights updated per statement",
+        )
+
+    def handle(self, *args, **options):
+        highest = Block.objects.aggregate(Max("height"))["height__max"]
+        if highest is None:
+            return
+
+        for start in range(0, highest + 1, options["batch_size"]):
+            end = start + options["batch_size"] - 1
+
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "UPDATE blockchain_block AS b SET "
+                    "input_count = (SELECT count(*) FROM blockchain_input WHERE block_id = b.hash), "
+                    "output_count = (SELECT count(*) FROM blockchain_output WHERE block_id = b.hash), "
+                    "kernel_count = (SELECT count(*) FROM blockchain_kernel WHERE block_id = b.hash), "
+                    "fee_total = (SELECT coalesce(sum(fee), 0) FROM blockchain_kernel WHERE block_id = b.hash) "
+                    "WHERE b.height BETWEEN %s AND %s",
+                    [start, end])
+                updated = cursor.rowcount
+
+            self.stdout.write("Updated {} blocks @ {}-{}".format(updated, start, end))
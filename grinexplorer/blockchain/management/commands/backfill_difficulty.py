@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Max
+from psycopg2.extras import execute_values
+
+from blockchain.importer import TARGET_DIFFICULTY_SQL
+from blockchain.models import Block, block_difficulty
+
+
+class Command(BaseCommand):
+    help = "Fill in the achieved and target difficulty of the stored blocks"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Number of heights updated per statement",
+        )
+
+    def handle(self, *args, **options):
+        highest = Block.objects.aggregate(Max("height"))["height__max"]
+        if highest is None:
+            return
+
+        for start in range(0, highest + 1, options["batch_size"]):
+            end = start + options["batch_size"] - 1
+
+            blocks = Block.objects.filter(height__range=(start, end)) \
+                                  .values_list("hash", "edge_bits", "secondary_scaling")
+            difficulties = [
+                (bytes.fromhex(hash), block_difficulty(hash, edge_bits, secondary_scaling))
+                for (hash, edge_bits, secondary_scaling) in blocks
+            ]
+
+            with transaction.atomic(), connection.cursor() as cursor:
+                execute_values(
+                    cursor,
+                    "UPDATE blockchain_block AS b SET difficulty = v.difficulty "
+                    "FROM (VALUES %s) AS v (hash, difficulty) "
+                    "WHERE b.hash = v.hash",
+                    difficulties,
+                    page_size=len(difficulties) or 1,
+                )
+                cursor.execute(
+                    TARGET_DIFFICULTY_SQL.format("b.height BETWEEN %s AND %s"),
+                    [start, end])
+
+            self.stdout.write("Updated {} blocks @ {}-{}".format(len(difficulties), start, end))
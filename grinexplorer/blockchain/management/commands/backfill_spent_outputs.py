@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Max
+
+from blockchain.importer import SPENT_OUTPUTS_SQL
+from blockchain.models import Block
+
+
+class Command(BaseCommand):
+    help = "Link the stored outputs to the blocks spending them"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Number of heights whose inputs are linked per statement",
+        )
+
+    def handle(self, *args, **options):
+        highest = Block.objects.aggregate(Max("height"))["height__max"]
+        if highest is None:
+            return
+
+        for start in range(0, highest + 1, options["batch_size"]):
+            end = start + options["batch_size"] - 1
+
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    SPENT_OUTPUTS_SQL.format("b.height BETWEEN %s AND %s"),
+                    [start, end])
+                linked = cursor.rowcount
+
+            self.stdout.write("Linked {} spent outputs to inputs @ {}-{}".format(
+                linked, start, end))
@@ -0,0 +1,82 @@
+import io
+import time
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from blockchain.models import Block, Input, Output, Kernel
+from blockchain.stubnode import StubNode, SyntheticChain
+
+
+class Command(BaseCommand):
+    help = ("Measure the throughput of import_from_tip against a local stub "
+            "node serving a synthetic chain, using a temporary test database")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--blocks",
+            type=int,
+            default=1000,
+            help="Length of the synthetic chain",
+        )
+        parser.add_argument("--inputs", type=int, default=2, help="Inputs per block")
+        parser.add_argument("--outputs", type=int, default=3, help="Outputs per block")
+        parser.add_argument("--kernels", type=int, default=2, help="Kernels per block")
+        parser.add_argument(
+            "--import-args",
+            type=str,
+            default="",
+            help="Extra arguments for import_from_tip, e.g. \"--workers 8 --batch-size 500\"",
+        )
+        parser.add_argument(
+            "--keepdb",
+            action="store_true",
+            help="Don't destroy the test database afterwards",
+        )
+
+    def handle(self, *args, **options):
+        chain = SyntheticChain(
+            options["blocks"],
+            inputs=options["inputs"],
+            outputs=options["outputs"],
+            kernels=options["kernels"],
+        )
+        node = StubNode(chain)
+
+        old_name = connection.settings_dict["NAME"]
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        node.start()
+
+        round_trips = 0
+
+        def count_round_trips(execute, sql, params, many, context):
+            nonlocal round_trips
+            round_trips += 1
+            return execute(sql, params, many, context)
+
+        try:
+            started = time.monotonic()
+            with connection.execute_wrapper(count_round_trips):
+                call_command(
+                    "import_from_tip", node.url, *options["import_args"].split(),
+                    stdout=io.StringIO())
+            elapsed = time.monotonic() - started
+
+            blocks = Block.objects.count()
+            rows = blocks + Input.objects.count() + Output.objects.count() + Kernel.objects.count()
+        finally:
+            node.stop()
+            if not options["keepdb"]:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        self.stdout.write("blocks:               {}".format(blocks))
+        self.stdout.write("rows:                 {}".format(rows))
+        self.stdout.write("elapsed:              {:.2f}s".format(elapsed))
+        # avoid dividing by zero should nothing have been imported
+        per_block = max(blocks, 1)
+        self.stdout.write("blocks/s:             {:.1f}".format(blocks / elapsed))
+        self.stdout.write("rows/s:               {:.1f}".format(rows / elapsed))
+        self.stdout.write("RPC calls/block:      {:.2f}".format(node.rpc_calls / per_block))
+        self.stdout.write("HTTP requests/block:  {:.2f}".format(node.http_requests / per_block))
+        self.stdout.write("DB round trips/block: {:.2f}".format(round_trips / per_block))
@@ -0,0 +1,177 @@
+import json
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, connections
+
+from blockchain.archive import OPENERS, open_archive
+from blockchain.fields import HexField
+from blockchain.models import Block, Input, Kernel, Output
+
+TABLES = {
+    "blocks": Block,
+    "inputs": Input,
+    "outputs": Output,
+    "kernels": Kernel,
+}
+
+FORMATS = ("csv", "ndjson")
+
+# rows fetched from the server-side cursor at once for NDJSON exports
+CHUNK_SIZE = 5000
+
+
+def export_columns(model):
+    # (SQL expression, name) of the exported columns, binary fields (and
+    # foreign keys to blocks) as hex and the rows of the other tables with the
+    # height of their block
+    columns = []
+    for field in model._meta.concrete_fields:
+        expression = "t.{}".format(connection.ops.quote_name(field.column))
+        if isinstance(field.target_field if field.is_relation else field, HexField):
+            expression = "encode({}, 'hex')".format(expression)
+        columns.append((expression, field.column))
+
+    if model is not Block and "block_height" not in {name for (_, name) in columns}:
+        columns.append(("b.height", "block_height"))
+
+    return columns
+
+
+def export_query(model, start, end):
+    columns = export_columns(model)
+    select = ", ".join("{} AS {}".format(expression, connection.ops.quote_name(name))
+                       for (expression, name) in columns)
+
+    if model is Block:
+        sql = "SELECT {} FROM blockchain_block t " \
+              "WHERE t.height BETWEEN %s AND %s " \
+              "ORDER BY t.height, t.total_difficulty DESC"
+    else:
+        sql = "SELECT {} FROM {} t JOIN blockchain_block b ON b.hash = t.block_id " \
+              "WHERE b.height BETWEEN %s AND %s " \
+              "ORDER BY b.height, t.id"
+
+    return (sql.format(select, model._meta.db_table), [start, end],
+            [name for (_, name) in columns])
+
+
+def export_table(table, path, start, end, fmt):
+    # Writes the rows of `table` from the blocks at the heights `start` to
+    # `end` to `path`, streaming them from the database so memory use doesn't
+    # depend on the size of the export. Returns the number of rows written.
+    (sql, params, names) = export_query(TABLES[table], start, end)
+
+    if fmt == "csv":
+        # COPY has the server format the rows, written to the file as they
+        # arrive
+        with open_archive(path, "wb") as f, connection.cursor() as cursor:
+            query = cursor.mogrify(sql, params).decode()
+            cursor.copy_expert("COPY ({}) TO STDOUT WITH CSV HEADER".format(query), f)
+            return cursor.rowcount
+
+    count = 0
+    with open_archive(path, "wt") as f, connection.chunked_cursor() as cursor:
+        cursor.cursor.itersize = CHUNK_SIZE
+        cursor.execute(sql, params)
+        for row in cursor:
+            f.write(json.dumps(dict(zip(names, row)), cls=DjangoJSONEncoder,
+                               separators=(",", ":")))
+            f.write("\n")
+            count += 1
+
+    return count
+
+
+class Command(BaseCommand):
+    help = "Export the blocks, inputs, outputs and kernels of a range of heights as CSV or NDJSON"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "directory",
+            type=str,
+            help="Directory the files are written to, one per table",
+        )
+        parser.add_argument(
+            "--from-height",
+            type=int,
+            default=0,
+            help="First height exported",
+        )
+        parser.add_argument(
+            "--to-height",
+            type=int,
+            default=None,
+            help="Last height exported (defaults to the highest stored block)",
+        )
+        parser.add_argument(
+            "--tables",
+            type=str,
+            default=",".join(TABLES),
+            help="Comma separated tables to export, out of {}".format(", ".join(TABLES)),
+        )
+        parser.add_argument(
+            "--format",
+            choices=FORMATS,
+            default="csv",
+            help="Format of the exported files",
+        )
+        parser.add_argument(
+            "--compress",
+            choices=[extension[1:] for extension in OPENERS],
+            default=None,
+            help="Compress the exported files",
+        )
+        parser.add_argument(
+            "--jobs",
+            type=int,
+            default=1,
+            help="Number of tables exported concurrently by separate processes",
+        )
+
+    def handle(self, *args, **options):
+        tables = [table.strip() for table in options["tables"].split(",") if table.strip()]
+        unknown = set(tables) - set(TABLES)
+        if unknown:
+            raise CommandError("Unknown tables: {}".format(", ".join(sorted(unknown))))
+
+        start = options["from_height"]
+        end = options["to_height"]
+        if end is None:
+            end = Block.objects.order_by("-height").values_list("height", flat=True).first()
+            if end is None:
+                raise CommandError("There are no blocks to export")
+
+        os.makedirs(options["directory"], exist_ok=True)
+        extension = "." + options["format"]
+        if options["compress"]:
+            extension += "." + options["compress"]
+        paths = {
+            table: os.path.join(options["directory"], table + extension)
+            for table in tables
+        }
+
+        jobs = max(min(options["jobs"], len(tables)), 1)
+        if jobs == 1:
+            counts = [
+                export_table(table, paths[table], start, end, options["format"])
+                for table in tables
+            ]
+        else:
+            # the worker processes must not share the connection of this one
+            connections.close_all()
+
+            with ProcessPoolExecutor(max_workers=jobs,
+                                     mp_context=multiprocessing.get_context("fork")) as executor:
+                futures = [
+                    executor.submit(export_table, table, paths[table], start, end, options["format"])
+                    for table in tables
+                ]
+                counts = [future.result() for future in futures]
+
+        for (table, count) in zip(tables, counts):
+            self.stdout.write("Exported {} {} @ {}-{} to {}".format(
+                count, table, start, end, paths[table]))
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+
+from blockchain.archive import read_archive
+from blockchain.importer import BlockWriter, chunked
+
+
+class Command(BaseCommand):
+    help = "Import the blocks of an archive recorded with `import_from_tip --record`"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", type=str)
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=100,
+            help="Number of blocks stored per database transaction",
+        )
+
+    def handle(self, *args, **options):
+        writer = BlockWriter(batch_size=options["batch_size"], stdout=self.stdout)
+
+        for blocks in chunked(read_archive(options["path"]), options["batch_size"]):
+            existing = writer.existing(
+                block_data["header"]["hash"] for block_data in blocks)
+
+            for block_data in blocks:
+                header = block_data["header"]
+
+                if header["hash"] in existing:
+                    self.stdout.write("Block {} already exists @ {}".format(
+                        header["hash"], header["height"]))
+                    writer.link(header["hash"], header["previous"])
+                else:
+                    writer.add(block_data)
+
+        writer.flush()
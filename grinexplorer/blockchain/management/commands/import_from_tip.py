@@ -1,11 +1,26 @@
-import json
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
 from enum import Enum
 
-import requests
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections, connection, connections
+from django.db.models import Max, Min
 
-from django.core.management.base import BaseCommand
+from blockchain.archive import ArchiveWriter
+from blockchain.importer import (
+    SPENT_OUTPUTS_SQL, BlockPipeline, BlockWriter, chunked, common_ancestor, update_daily_stats)
+from blockchain.models import Block, ImportCheckpoint
+from blockchain.node import NodeClient, NodeError, NodeResponseError, NodeRPCError
+from blockchain.signals import chain_reorged
 
-from blockchain.models import Block, Input, Output, Kernel
+
+# `previous` of the genesis block
+GENESIS_PREVIOUS = "ffffffffffffffffffffffffffffffffffffffffffffffffffffffffffffffff"
+
+# number of heights whose inputs are linked to the outputs they spend per
+# statement after a sharded backfill
+SPENT_OUTPUTS_CHUNK = 1000
 
 
 class Status(Enum):
@@ -13,19 +28,24 @@ class Status(Enum):
     ALREADY_EXISTS = 1
 
 
+def import_shard(url, start, end, options):
+    # entry point of the worker processes of the backfill mode
+    command = Command()
+    command.node = command.get_node(url, options)
+    command.archive = None
+    return command.import_heights(start, end, options)
+
+
 class Command(BaseCommand):
     help = "Import the Blockchain starting from the current tip"
 
-    def rpc(self, method, **params):
-        resp = requests.post(
-            self.API_BASE,
-            json={
-                "id": "json",
-                "method": method,
-                "params": params,
-            })
-
-        return resp.json()["result"]["Ok"]
+    def get_node(self, url, options):
+        return NodeClient(
+            url,
+            timeout=options["timeout"],
+            retries=options["retries"],
+            pool_size=options["workers"],
+        )
 
     def add_arguments(self, parser):
         parser.add_argument("url", type=str)
@@ -35,101 +55,429 @@ class Command(BaseCommand):
             default=False,
             help="Continue scanning even if Block already exists",
         )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=4,
+            help="Number of blocks fetched from the node concurrently",
+        )
+        parser.add_argument(
+            "--queue-depth",
+            type=int,
+            default=32,
+            help="Maximum number of fetched blocks waiting to be stored",
+        )
+        parser.add_argument(
+            "--rpc-batch",
+            type=int,
+            default=10,
+            help="Number of blocks requested from the node per HTTP request",
+        )
+        parser.add_argument(
+            "--timeout",
+            type=float,
+            default=30,
+            help="Timeout in seconds of requests to the node",
+        )
+        parser.add_argument(
+            "--retries",
+            type=int,
+            default=5,
+            help="Number of times a failed request to the node is retried",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=100,
+            help="Number of blocks stored per database transaction",
+        )
+        parser.add_argument(
+            "--from-height",
+            type=int,
+            default=None,
+            help="Backfill the main chain by height, starting at this height",
+        )
+        parser.add_argument(
+            "--to-height",
+            type=int,
+            default=None,
+            help="Last height to backfill (defaults to the current tip)",
+        )
+        parser.add_argument(
+            "--shards",
+            type=int,
+            default=4,
+            help="Number of worker processes the backfill range is split across",
+        )
+        parser.add_argument(
+            "--record",
+            type=str,
+            default=None,
+            help="Also write the imported blocks to this archive (NDJSON, "
+                 "compressed if the name ends with .gz, .bz2 or .xz)",
+        )
+        parser.add_argument(
+            "--resume",
+            action="store_true",
+            help="Continue an interrupted import where it stopped",
+        )
+        parser.add_argument(
+            "--follow",
+            action="store_true",
+            help="Keep running and import new blocks as soon as the node has them",
+        )
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=0.5,
+            help="Seconds between polls of the node's tip in follow mode",
+        )
+        parser.add_argument(
+            "--max-poll-interval",
+            type=float,
+            default=30,
+            help="Upper bound of the poll interval while the node is unavailable",
+        )
 
     def handle(self, *args, **options):
-        self.API_BASE = "%s/v2/foreign" % options["url"]
+        self.node = self.get_node(options["url"], options)
 
         try:
-            data = self.rpc("get_tip")
-        except json.decoder.JSONDecodeError:
-            print("Decoding JSON failed (make sure to disable api_secret_path in grin-server.toml")
-            print("resp=%r" % resp.text)
-            exit()
+            data = self.node.call("get_tip")
+        except NodeResponseError as e:
+            raise CommandError("{} (make sure to disable api_secret_path in grin-server.toml)".format(e))
+        except NodeError as e:
+            raise CommandError(e)
 
         height = data["height"]
         tip = data["last_block_pushed"]
         self.stdout.write("height={}, tip={}\n\n".format(height, tip))
 
-        hash = tip
-        parent = None
+        to_height = options["to_height"]
+        if to_height is None:
+            to_height = height
+
+        if options["from_height"] is not None and to_height < options["from_height"]:
+            raise CommandError("--to-height must not be lower than --from-height")
+
+        if options["record"] and options["from_height"] is not None and options["shards"] > 1:
+            raise CommandError("--record can only be used with a single shard (--shards 1)")
+
+        self.archive = None
+        if options["record"]:
+            self.archive = ArchiveWriter(options["record"])
+
+        try:
+            if options["from_height"] is not None:
+                self.backfill(options["url"], options["from_height"], to_height, options)
+            else:
+                self.writer = BlockWriter(batch_size=options["batch_size"], stdout=self.stdout)
+
+                if options["resume"] and self.resume(options):
+                    # the interrupted import has been finished, only the
+                    # blocks new since then are left
+                    self.import_from(tip, height, dict(options, **{"full-scan": False}))
+                else:
+                    self.import_from(tip, height, options)
+
+                if options["follow"]:
+                    self.follow(tip, height, options)
+        except NodeRPCError as e:
+            raise CommandError("{} (make sure to set `archive_mode=true` in grin-server.toml)".format(e))
+        except NodeError as e:
+            raise CommandError(e)
+        finally:
+            if self.archive is not None:
+                self.archive.close()
+
+    def follow(self, tip, height, options):
+        # Polls the node's tip and imports the blocks that are new since the
+        # last poll. If the new tip doesn't build on the last one, the chain
+        # has been reorganized: the competing branch is imported back to the
+        # first stored block, and `chain_reorged` is sent with the block the
+        # two chains have in common.
+        interval = options["poll_interval"]
+        # only the initial import scans the whole chain
+        options = dict(options, **{"full-scan": False})
         while True:
-            (status, block_hash, prev_hash) = self.fetch_and_store_block(hash, parent)
+            time.sleep(interval)
+
+            # this process is long-running, don't hold on to broken or
+            # expired database connections
+            close_old_connections()
+
+            try:
+                data = self.node.call("get_tip")
+
+                if data["last_block_pushed"] != tip:
+                    self.stdout.write("height={}, tip={}".format(
+                        data["height"], data["last_block_pushed"]))
+
+                    self.import_from(
+                        data["last_block_pushed"], data["height"], options,
+                        depth=max(data["height"] - height, 1))
+
+                    # the new tip may build on the last one, or on another
+                    # branch, or even be one of the blocks before it
+                    fork_point = common_ancestor(tip, data["last_block_pushed"])
+                    if fork_point is not None and fork_point != tip:
+                        self.stdout.write("== reorg: chain forked at block {}, replacing tip {}".format(
+                            fork_point, tip))
+                        chain_reorged.send(
+                            sender=self.__class__, fork_point=fork_point, tip=tip)
+
+                    tip = data["last_block_pushed"]
+                    height = data["height"]
+            except NodeError as e:
+                # keep running, but back off while the node has trouble
+                interval = min(interval * 2, options["max_poll_interval"])
+                self.stderr.write("Polling the node failed, retrying in {:.1f}s: {}".format(
+                    interval, e))
+            else:
+                interval = options["poll_interval"]
+
+    def checkpoint_mode(self, options):
+        return "full-scan" if options["full-scan"] else "tip"
+
+    def resume(self, options):
+        # Continues the walk of an interrupted import from the last block
+        # stored by it and returns whether there was one. The blocks between
+        # the tip and the ones stored by the interrupted import are imported
+        # afterwards, without scanning the chain again.
+        try:
+            checkpoint = ImportCheckpoint.objects.get(mode=self.checkpoint_mode(options))
+        except ImportCheckpoint.DoesNotExist:
+            self.stdout.write("No checkpoint found, nothing to resume")
+            return False
+
+        self.stdout.write("Resuming import at block {} @ {}".format(
+            checkpoint.hash, checkpoint.height))
+
+        if checkpoint.previous == GENESIS_PREVIOUS:
+            checkpoint.delete()
+            return True
+
+        self.writer.link(checkpoint.hash, checkpoint.previous)
+        self.import_from(checkpoint.previous, checkpoint.height - 1, options)
+        return True
+
+    def import_from(self, tip, height, options, depth=None):
+        # Imports the chain from `tip` back to the first stored block (or the
+        # genesis block) and returns the hash of that stored block, if any.
+        # Blocks are fetched ahead by height, which lets several of them be
+        # in flight at once; `depth` limits how far that's done. The chain is
+        # still walked along the `previous` hashes: should a fetched block not
+        # be the one we expect (e.g. because of a reorg), or should we get
+        # past `depth`, `walk()` fetches it by hash.
+        if depth is None and not options["full-scan"]:
+            # the walk usually stops at the highest stored block, don't fetch
+            # ahead past it
+            highest = Block.objects.filter(height__lte=height) \
+                                   .aggregate(Max("height"))["height__max"]
+            if highest is not None:
+                depth = height - highest + 1
+
+        pipeline = BlockPipeline(
+            self.fetch_blocks,
+            range(height, -1 if depth is None else max(height - depth, -1), -1),
+            workers=options["workers"],
+            queue_depth=options["queue_depth"],
+            chunk_size=options["rpc_batch"],
+        )
+
+        mode = self.checkpoint_mode(options)
+
+        parent = None
+        stored = None
+        walked = 0
+        for (block_data, exists) in self.walk(pipeline, tip, options["batch_size"]):
+            self.writer.checkpoint = ImportCheckpoint(
+                mode=mode,
+                hash=block_data["header"]["hash"],
+                height=block_data["header"]["height"],
+                previous=block_data["header"]["previous"],
+            )
+
+            if self.archive is not None:
+                self.archive.write(block_data)
+
+            (status, block_hash, prev_hash) = self.store_block(block_data, parent, exists)
+
+            # the writer saves the checkpoint with each batch of new blocks;
+            # a full scan over stored blocks has to save it too
+            walked += 1
+            if walked % options["batch_size"] == 0:
+                self.writer.flush()
 
             if not options["full-scan"] and status == Status.ALREADY_EXISTS:
                 self.stdout.write("== exiting early")
+                stored = block_hash
                 break
 
-            if prev_hash == "ffffffffffffffffffffffffffffffffffffffffffffffffffffffffffffffff":
+            if prev_hash == GENESIS_PREVIOUS:
                 break
 
             # continue along the chain
-            hash = prev_hash
             parent = block_hash
 
-    def fetch_and_store_block(self, hash, parent_hash):
-        try:
-            block_data = self.rpc("get_block", hash=hash, height=None, commit=None)
-        except json.decoder.JSONDecodeError:
-            print("Decoding JSON failed (make sure to set `archive_mode=true` in grin-server.toml")
-            print("resp=%r" % resp.text)
-            exit()
+        self.writer.flush()
+        self.writer.checkpoint = None
+        ImportCheckpoint.objects.filter(mode=mode).delete()
 
-        try:
-            block = Block.objects.get(hash=hash)
-            self.stdout.write("Block {} already exists @ {}".format(
-                block.hash, block.height))
+        return stored
 
-            if parent_hash is not None:
-                parent = Block.objects.get(hash=parent_hash)
+    def walk(self, pipeline, tip, batch_size):
+        # Yields the blocks along the chain starting at `tip`, each together
+        # with whether it's stored already. Which blocks exist is checked
+        # with one query per `batch_size` blocks.
+        hash = tip
+        for blocks in chunked(pipeline, batch_size):
+            existing = self.writer.existing(
+                block_data["header"]["hash"] for block_data in blocks)
+
+            for block_data in blocks:
+                if block_data["header"]["hash"] != hash:
+                    block_data = self.fetch_block(hash=hash)
+                    existing |= self.writer.existing([hash])
 
-                if parent.previous is None:
-                    assert parent.height == block.height + 1
-                    parent.previous = block
-                    parent.save(update_fields=["previous"])
-                    self.stdout.write("Stored block {} as previous of block {}".format(
-                        block.hash[:6], parent.hash[:6]))
+                yield (block_data, hash in existing)
+
+                hash = block_data["header"]["previous"]
+
+        # the pipeline only fetched the blocks down to a given height, go on
+        # by hash from there
+        while True:
+            block_data = self.fetch_block(hash=hash)
 
-            return (Status.ALREADY_EXISTS, block.hash, block_data["header"]["previous"])
-        except Block.DoesNotExist:
-            pass
+            yield (block_data, hash in self.writer.existing([hash]))
 
-        assert hash == block_data["header"]["hash"]
+            hash = block_data["header"]["previous"]
 
-        # we can't set the `previous` PK now because it doesn't exist yet. We'll
-        # set it in the next call of this function, when the previous Block is saved
-        previous = block_data["header"].pop("previous")
+    def backfill(self, url, from_height, to_height, options):
+        shards = max(min(options["shards"], to_height - from_height + 1), 1)
+        size = (to_height - from_height) // shards + 1
+        ranges = [
+            (start, min(start + size - 1, to_height))
+            for start in range(from_height, to_height + 1, size)
+        ]
 
-        block = Block.objects.create(
-            previous=None,
-            **block_data["header"],
+        if len(ranges) == 1:
+            boundaries = [self.import_heights(from_height, to_height, options)]
+        else:
+            # the worker processes must not share the connection of this one
+            connections.close_all()
+
+            with ProcessPoolExecutor(max_workers=len(ranges),
+                                     mp_context=multiprocessing.get_context("fork")) as executor:
+                futures = [
+                    executor.submit(import_shard, url, start, end, options)
+                    for (start, end) in ranges
+                ]
+                boundaries = [future.result() for future in futures]
+
+        # link the first block of each shard to the last block of the shard
+        # before it, now that all of them are stored
+        writer = BlockWriter(stdout=self.stdout)
+        for boundary in boundaries:
+            for (hash, previous) in boundary.items():
+                writer.link(hash, previous)
+        writer.flush()
+
+        if len(ranges) > 1:
+            # the shards may have updated the stats of the days they share
+            # concurrently, so recompute the stats of the whole range
+            span = Block.objects.filter(height__range=(from_height, to_height)) \
+                                .aggregate(Min("timestamp"), Max("timestamp"))
+            if span["timestamp__min"] is not None:
+                update_daily_stats(span["timestamp__min"], span["timestamp__max"])
+
+            # a batch only sees the inputs and outputs of the other shards
+            # that were committed before it, so outputs spent across two
+            # batches stored at the same time are linked now
+            for start in range(from_height, to_height + 1, SPENT_OUTPUTS_CHUNK):
+                end = min(start + SPENT_OUTPUTS_CHUNK - 1, to_height)
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        SPENT_OUTPUTS_SQL.format("b.height BETWEEN %s AND %s"), [start, end])
+
+    def import_heights(self, start, end, options):
+        # Imports the main chain blocks from height `start` to `end` and
+        # returns the links to previous blocks that couldn't be stored
+        # because the previous block is not part of this range (yet).
+        self.writer = BlockWriter(batch_size=options["batch_size"], stdout=self.stdout)
+
+        mode = "backfill:{}-{}".format(start, end)
+        if options["resume"]:
+            checkpoint = ImportCheckpoint.objects.filter(mode=mode).first()
+            if checkpoint is not None:
+                self.stdout.write("Resuming backfill of {}-{} at height {}".format(
+                    start, end, checkpoint.height + 1))
+
+                # the link of the first block to the previous shard was only
+                # kept in the memory of the interrupted process
+                header = self.fetch_block(height=start)["header"]
+                self.writer.link(header["hash"], header["previous"])
+
+                start = checkpoint.height + 1
+
+        pipeline = BlockPipeline(
+            self.fetch_blocks,
+            range(start, end + 1),
+            workers=options["workers"],
+            queue_depth=options["queue_depth"],
+            chunk_size=options["rpc_batch"],
         )
-        for input_data in block_data["inputs"]:
-            Input.objects.create(
-                block=block,
-                data=input_data,
-            )
 
-        for output_data in block_data["outputs"]:
-            Output.objects.create(
-                block=block,
-                **output_data,
-            )
+        for blocks in chunked(pipeline, options["batch_size"]):
+            existing = self.writer.existing(
+                block_data["header"]["hash"] for block_data in blocks)
 
-        for kernel_data in block_data["kernels"]:
-            Kernel.objects.create(
-                block=block,
-                **kernel_data,
-            )
+            for block_data in blocks:
+                header = block_data["header"]
+
+                self.writer.checkpoint = ImportCheckpoint(
+                    mode=mode,
+                    hash=header["hash"],
+                    height=header["height"],
+                    previous=header["previous"],
+                )
+
+                if self.archive is not None:
+                    self.archive.write(block_data)
+
+                if header["hash"] in existing:
+                    self.writer.link(header["hash"], header["previous"])
+                else:
+                    self.writer.add(block_data)
+
+        self.writer.flush()
+        self.writer.checkpoint = None
+        ImportCheckpoint.objects.filter(mode=mode).delete()
+
+        return self.writer.unlinked
+
+    def fetch_block(self, hash=None, height=None):
+        return self.node.call("get_block", hash=hash, height=height, commit=None)
+
+    def fetch_blocks(self, heights):
+        return self.node.batch([
+            ("get_block", {"hash": None, "height": height, "commit": None})
+            for height in heights
+        ])
+
+    def store_block(self, block_data, parent_hash, exists):
+        header = block_data["header"]
+
+        if exists:
+            self.stdout.write("Block {} already exists @ {}".format(
+                header["hash"], header["height"]))
+            status = Status.ALREADY_EXISTS
+
+            # set parent's `previous` PK to this Block, in case it's missing
+            if parent_hash is not None:
+                self.writer.link(parent_hash, header["hash"])
+        else:
+            self.writer.add(block_data)
+            status = Status.CREATED
 
-        self.stdout.write("Stored block {} @ {}".format(
-            block.hash, block.height))
-        # set parent's `previous` PK to this Block
-        if parent_hash is not None:
-            parent = Block.objects.get(hash=parent_hash)
-            assert parent.height == block.height + 1
-            parent.previous = block
-            parent.save(update_fields=["previous"])
-            self.stdout.write("  Marked block {} as previous of block {}".format(
-                block.hash[:6], parent.hash[:6]))
-
-        return (Status.CREATED, block.hash, previous)
+        return (status, header["hash"], header["previous"])
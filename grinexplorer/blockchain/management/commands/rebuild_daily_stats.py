@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max, Min
+
+from blockchain.importer import update_daily_stats
+from blockchain.models import Block, DailyStats
+
+
+class Command(BaseCommand):
+    help = "Rebuild the daily stats used by the charts from the stored blocks"
+
+    def handle(self, *args, **options):
+        span = Block.objects.aggregate(Min("timestamp"), Max("timestamp"))
+
+        with transaction.atomic():
+            DailyStats.objects.all().delete()
+
+            if span["timestamp__min"] is not None:
+                update_daily_stats(span["timestamp__min"], span["timestamp__max"])
+
+        self.stdout.write("Rebuilt the stats of {} days".format(DailyStats.objects.count()))
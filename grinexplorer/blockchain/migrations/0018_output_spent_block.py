@@ -0,0 +1,24 @@
+# Generated by Django 2.2.24 on 2026-10-18 17:22
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blockchain', '0017_kernel_fee_shift'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='output',
+            name='spent_block',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, related_name='spent_output_set', to='blockchain.Block'),
+        ),
+        migrations.AddField(
+            model_name='output',
+            name='spent_height',
+            field=models.IntegerField(null=True),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 2.2.24 on 2026-10-18 17:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blockchain', '0018_output_spent_block'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportCheckpoint',
+            fields=[
+                ('mode', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('hash', models.CharField(max_length=64)),
+                ('height', models.IntegerField()),
+                ('previous', models.CharField(max_length=64)),
+                ('updated', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
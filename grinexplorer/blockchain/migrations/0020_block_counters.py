@@ -0,0 +1,33 @@
+# Generated by Django 2.2.24 on 2026-10-18 17:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blockchain', '0019_importcheckpoint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='block',
+            name='fee_total',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='block',
+            name='input_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='block',
+            name='kernel_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='block',
+            name='output_count',
+            field=models.IntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 2.2.24 on 2026-10-18 17:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blockchain', '0020_block_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyStats',
+            fields=[
+                ('date', models.DateField(primary_key=True, serialize=False)),
+                ('blocks', models.IntegerField()),
+                ('max_total_difficulty', models.BigIntegerField()),
+                ('fees', models.BigIntegerField()),
+                ('kernels', models.IntegerField()),
+                ('inputs', models.IntegerField()),
+                ('outputs', models.IntegerField()),
+                ('block_interval', models.FloatField(null=True)),
+            ],
+        ),
+    ]
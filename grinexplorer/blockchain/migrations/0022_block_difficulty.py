@@ -0,0 +1,23 @@
+# Generated by Django 2.2.24 on 2026-10-18 17:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blockchain', '0021_dailystats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='block',
+            name='difficulty',
+            field=models.BigIntegerField(db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='block',
+            name='target_difficulty',
+            field=models.BigIntegerField(db_index=True, null=True),
+        ),
+    ]
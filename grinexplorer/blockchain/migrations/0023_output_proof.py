@@ -0,0 +1,38 @@
+# Generated by Django 2.2.24 on 2026-10-18 17:31
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blockchain', '0022_block_difficulty'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OutputProof',
+            fields=[
+                ('output', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='proofs', serialize=False, to='blockchain.Output')),
+                ('proof', models.TextField(null=True)),
+                ('merkle_proof', models.TextField(null=True)),
+            ],
+        ),
+        migrations.RunSQL(
+            "INSERT INTO blockchain_outputproof (output_id, proof, merkle_proof) "
+            "SELECT id, proof, merkle_proof FROM blockchain_output "
+            "WHERE proof IS NOT NULL OR merkle_proof IS NOT NULL",
+            reverse_sql="UPDATE blockchain_output AS o "
+                        "SET proof = p.proof, merkle_proof = p.merkle_proof "
+                        "FROM blockchain_outputproof AS p WHERE p.output_id = o.id",
+        ),
+        migrations.RemoveField(
+            model_name='output',
+            name='merkle_proof',
+        ),
+        migrations.RemoveField(
+            model_name='output',
+            name='proof',
+        ),
+    ]
@@ -0,0 +1,178 @@
+# Generated by Django 2.2.24 on 2026-10-18 17:33
+
+import blockchain.fields
+from django.db import migrations
+
+# the hex columns and their type before this migration, per table; the
+# foreign keys to blockchain_block are converted together with its primary key
+HEX_COLUMNS = {
+    "blockchain_block": [
+        ("hash", "varchar(64)"),
+        ("previous_id", "varchar(64)"),
+        ("prev_root", "varchar(64)"),
+        ("output_root", "varchar(64)"),
+        ("range_proof_root", "varchar(64)"),
+        ("kernel_root", "varchar(64)"),
+        ("total_kernel_offset", "varchar(64)"),
+    ],
+    "blockchain_input": [
+        ("block_id", "varchar(64)"),
+        ("data", "varchar(66)"),
+    ],
+    "blockchain_output": [
+        ("block_id", "varchar(64)"),
+        ("commit", "varchar(66)"),
+        ("proof_hash", "varchar(64)"),
+        ("spent_block_id", "varchar(64)"),
+    ],
+    "blockchain_outputproof": [
+        ("proof", "text"),
+        ("merkle_proof", "text"),
+    ],
+    "blockchain_kernel": [
+        ("block_id", "varchar(64)"),
+        ("excess", "varchar(66)"),
+        ("excess_sig", "varchar(142)"),
+    ],
+}
+
+# the indexed varchar columns, which have an additional index for LIKE
+LIKE_INDEXES = [
+    ("blockchain_block", "hash"),
+    ("blockchain_block", "previous_id"),
+    ("blockchain_input", "block_id"),
+    ("blockchain_input", "data"),
+    ("blockchain_output", "block_id"),
+    ("blockchain_output", "commit"),
+    ("blockchain_output", "spent_block_id"),
+    ("blockchain_kernel", "block_id"),
+]
+
+
+def convert_columns(schema_editor, to_binary):
+    quote = schema_editor.quote_name
+
+    with schema_editor.connection.cursor() as cursor:
+        # the foreign keys to the blocks have to be dropped while the primary
+        # key's type changes
+        cursor.execute(
+            "SELECT conrelid::regclass, conname, pg_get_constraintdef(oid) "
+            "FROM pg_constraint WHERE contype = 'f' AND confrelid = 'blockchain_block'::regclass")
+        foreign_keys = cursor.fetchall()
+
+        for (table, name, _) in foreign_keys:
+            cursor.execute("ALTER TABLE %s DROP CONSTRAINT %s" % (table, quote(name)))
+
+        if to_binary:
+            for (table, column) in LIKE_INDEXES:
+                cursor.execute("DROP INDEX IF EXISTS %s" % quote(
+                    schema_editor._create_index_name(table, [column], suffix="_like")))
+
+        for (table, columns) in HEX_COLUMNS.items():
+            cursor.execute("ALTER TABLE %s %s" % (table, ", ".join(
+                "ALTER COLUMN {0} TYPE bytea USING decode({0}, 'hex')".format(quote(column))
+                if to_binary else
+                "ALTER COLUMN {0} TYPE {1} USING encode({0}, 'hex')".format(quote(column), type)
+                for (column, type) in columns
+            )))
+
+        if not to_binary:
+            for (table, column) in LIKE_INDEXES:
+                cursor.execute("CREATE INDEX %s ON %s (%s varchar_pattern_ops)" % (
+                    quote(schema_editor._create_index_name(table, [column], suffix="_like")),
+                    table, quote(column)))
+
+        for (table, name, definition) in foreign_keys:
+            cursor.execute("ALTER TABLE %s ADD CONSTRAINT %s %s" % (table, quote(name), definition))
+
+
+def to_binary(apps, schema_editor):
+    convert_columns(schema_editor, to_binary=True)
+
+
+def to_hex(apps, schema_editor):
+    convert_columns(schema_editor, to_binary=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blockchain', '0023_output_proof'),
+    ]
+
+    operations = [
+        # Django would convert the hex strings' characters rather than decode
+        # them, so the columns are converted by hand
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunPython(to_binary, to_hex),
+            ],
+            state_operations=[
+                migrations.AlterField(
+                    model_name='block',
+                    name='hash',
+                    field=blockchain.fields.HexField(db_index=True, primary_key=True, serialize=False),
+                ),
+                migrations.AlterField(
+                    model_name='block',
+                    name='kernel_root',
+                    field=blockchain.fields.HexField(),
+                ),
+                migrations.AlterField(
+                    model_name='block',
+                    name='output_root',
+                    field=blockchain.fields.HexField(),
+                ),
+                migrations.AlterField(
+                    model_name='block',
+                    name='prev_root',
+                    field=blockchain.fields.HexField(),
+                ),
+                migrations.AlterField(
+                    model_name='block',
+                    name='range_proof_root',
+                    field=blockchain.fields.HexField(),
+                ),
+                migrations.AlterField(
+                    model_name='block',
+                    name='total_kernel_offset',
+                    field=blockchain.fields.HexField(),
+                ),
+                migrations.AlterField(
+                    model_name='input',
+                    name='data',
+                    field=blockchain.fields.HexField(db_index=True),
+                ),
+                migrations.AlterField(
+                    model_name='kernel',
+                    name='excess',
+                    field=blockchain.fields.HexField(),
+                ),
+                migrations.AlterField(
+                    model_name='kernel',
+                    name='excess_sig',
+                    field=blockchain.fields.HexField(),
+                ),
+                migrations.AlterField(
+                    model_name='output',
+                    name='commit',
+                    field=blockchain.fields.HexField(db_index=True),
+                ),
+                migrations.AlterField(
+                    model_name='output',
+                    name='proof_hash',
+                    field=blockchain.fields.HexField(),
+                ),
+                migrations.AlterField(
+                    model_name='outputproof',
+                    name='merkle_proof',
+                    field=blockchain.fields.HexField(null=True),
+                ),
+                migrations.AlterField(
+                    model_name='outputproof',
+                    name='proof',
+                    field=blockchain.fields.HexField(null=True),
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 2.2.24 on 2026-10-18 17:34
+
+import blockchain.fields
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blockchain', '0024_binary_hex_fields'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='kernel',
+            name='excess',
+            field=blockchain.fields.HexField(db_index=True),
+        ),
+    ]
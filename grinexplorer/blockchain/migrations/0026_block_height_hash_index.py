@@ -0,0 +1,17 @@
+# Generated by Django 2.2.24 on 2026-10-18 18:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blockchain', '0025_kernel_excess_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='block',
+            index=models.Index(fields=['height', 'hash'], name='blockchain__height_3ba807_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 2.2.24 on 2026-10-18 18:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blockchain', '0026_block_height_hash_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='block',
+            name='total_difficulty',
+            field=models.BigIntegerField(db_index=True),
+        ),
+    ]
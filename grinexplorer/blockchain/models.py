@@ -1,8 +1,11 @@
 from django.db import models
 from django.contrib.postgres.fields import ArrayField
 
+from blockchain.fields import HexField
+
 SECOND_POW_EDGE_BITS = 29
 BASE_EDGE_BITS = 24
+MAX_STORED_DIFFICULTY = 2**63 - 1
 
 
 def graph_weight(edge_bits):
@@ -31,9 +34,21 @@ def from_proof_scaled(hash, secondary_scaling):
     return scaled_difficulty(hash, secondary_scaling)
 
 
+def block_difficulty(hash, edge_bits, secondary_scaling):
+    # Maximum difficulty this proof of work can achieve
+    # 2 proof of works, Cuckoo29 (for now) and Cuckoo30+, which are scaled
+    # differently (scaling not controlled for now)
+    if (edge_bits == SECOND_POW_EDGE_BITS):
+        diff = from_proof_scaled(hash, secondary_scaling)
+    else:
+        diff = from_proof_adjusted(hash, edge_bits)
+
+    # capped to fit into a (signed) bigint column
+    return min(int(diff), MAX_STORED_DIFFICULTY)
+
+
 class Block(models.Model):
-    hash = models.CharField(
-        max_length=64,
+    hash = HexField(
         db_index=True,
         primary_key=True,
     )
@@ -52,17 +67,17 @@ class Block(models.Model):
         null=True,
     )
 
-    prev_root = models.CharField(max_length=64)
+    prev_root = HexField()
 
     timestamp = models.DateTimeField(
         db_index=True,
     )
 
-    output_root = models.CharField(max_length=64)
+    output_root = HexField()
 
-    range_proof_root = models.CharField(max_length=64)
+    range_proof_root = HexField()
 
-    kernel_root = models.CharField(max_length=64)
+    kernel_root = HexField()
 
     nonce = models.TextField()
 
@@ -70,34 +85,48 @@ class Block(models.Model):
 
     cuckoo_solution = ArrayField(models.BigIntegerField())
 
-    difficulty = models.BigIntegerField()
+    # difficulty achieved by the proof of work and the difficulty the block
+    # had to reach (its total difficulty minus the previous block's), stored
+    # by the importer; target_difficulty is set once the previous block is
+    # stored
+    difficulty = models.BigIntegerField(
+        db_index=True,
+        null=True,
+    )
+
+    target_difficulty = models.BigIntegerField(
+        db_index=True,
+        null=True,
+    )
 
     # sum of the target difficulties, not the sum of the actual block difficulties
-    total_difficulty = models.BigIntegerField()
+    total_difficulty = models.BigIntegerField(
+        db_index=True,
+    )
 
     secondary_scaling = models.IntegerField()
 
-    total_kernel_offset = models.CharField(max_length=64)
+    total_kernel_offset = HexField()
 
     output_mmr_size = models.IntegerField()
 
     kernel_mmr_size = models.IntegerField()
 
-    @property
-    def difficulty(self):
-        # Maximum difficulty this proof of work can achieve
-        # 2 proof of works, Cuckoo29 (for now) and Cuckoo30+, which are scaled
-        # differently (scaling not controlled for now)
-        if (self.edge_bits == SECOND_POW_EDGE_BITS):
-            return int(from_proof_scaled(self.hash, self.secondary_scaling))
-        else:
-            return int(from_proof_adjusted(self.hash, self.edge_bits))
+    # number of inputs, outputs and kernels and the sum of the kernels' fees,
+    # stored by the importer so listing blocks doesn't need to load them
+    input_count = models.IntegerField(default=0)
 
-    @property
-    def target_difficulty(self):
-        if self.previous is None:
-            return None
-        return self.total_difficulty - self.previous.total_difficulty
+    output_count = models.IntegerField(default=0)
+
+    kernel_count = models.IntegerField(default=0)
+
+    fee_total = models.BigIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            # the order of the block list, so its pages can be seeked to
+            models.Index(fields=["height", "hash"]),
+        ]
 
     @property
     def reward(self):
@@ -105,7 +134,7 @@ class Block(models.Model):
 
     @property
     def fees(self):
-        return sum([x.fee for x in self.kernel_set.all()])
+        return self.fee_total
 
 
 class Input(models.Model):
@@ -115,8 +144,7 @@ class Input(models.Model):
         db_index=True,
     )
 
-    data = models.CharField(
-        max_length=66,
+    data = HexField(
         db_index=True,
     )
 
@@ -137,28 +165,47 @@ class Output(models.Model):
         choices=OUTPUT_TYPE
     )
 
-    commit = models.CharField(
-        max_length=66,
+    commit = HexField(
         db_index=True,
     )
 
     spent = models.BooleanField()
 
-    proof = models.TextField(null=True)
-
-    proof_hash = models.CharField(max_length=64)
+    proof_hash = HexField()
 
     block_height = models.IntegerField(null=True)
 
-    merkle_proof = models.TextField(null=True)
-
     mmr_index = models.IntegerField(null=True)
 
+    # the block containing the input that spends this output, set by the
+    # importer once both are stored
+    spent_block = models.ForeignKey(
+        related_name="spent_output_set",
+        to=Block,
+        on_delete=models.PROTECT,
+        db_index=True,
+        null=True,
+    )
+
+    spent_height = models.IntegerField(null=True)
+
     def occurrences(self):
         return 1
 
-    def spent_at(self):
-        return None
+
+class OutputProof(models.Model):
+    # The range proof and merkle proof of an output, which are large and
+    # rarely needed, so they're kept out of the output table
+    output = models.OneToOneField(
+        related_name="proofs",
+        to=Output,
+        on_delete=models.CASCADE,
+        primary_key=True,
+    )
+
+    proof = HexField(null=True)
+
+    merkle_proof = HexField(null=True)
 
 
 class Kernel(models.Model):
@@ -176,6 +223,49 @@ class Kernel(models.Model):
 
     lock_height = models.IntegerField()
 
-    excess = models.CharField(max_length=66)
+    excess = HexField(
+        db_index=True,
+    )
+
+    excess_sig = HexField()
+
+
+class DailyStats(models.Model):
+    # Aggregates of the stored blocks per day (UTC) for the charts, updated
+    # by the importer with each batch and rebuilt by `rebuild_daily_stats`
+    date = models.DateField(primary_key=True)
+
+    blocks = models.IntegerField()
+
+    max_total_difficulty = models.BigIntegerField()
+
+    fees = models.BigIntegerField()
+
+    kernels = models.IntegerField()
+
+    inputs = models.IntegerField()
+
+    outputs = models.IntegerField()
+
+    # average number of seconds between two blocks of the day
+    block_interval = models.FloatField(null=True)
+
+
+class ImportCheckpoint(models.Model):
+    # Progress of an import, stored together with each batch of blocks so an
+    # interrupted import can be resumed with `import_from_tip --resume`.
+    # `mode` is "tip" or "full-scan" for imports walking back from the tip,
+    # and "backfill:<from>-<to>" for each shard of a backfill.
+    mode = models.CharField(
+        max_length=64,
+        primary_key=True,
+    )
+
+    # the block processed last and its previous block
+    hash = models.CharField(max_length=64)
+
+    height = models.IntegerField()
+
+    previous = models.CharField(max_length=64)
 
-    excess_sig = models.CharField(max_length=142)
+    updated = models.DateTimeField(auto_now=True)
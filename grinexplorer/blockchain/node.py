@@ -0,0 +1,130 @@
+import random
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class NodeError(Exception):
+    pass
+
+
+class NodeUnavailable(NodeError):
+    # the node couldn't be reached or didn't answer in time, even after
+    # retrying
+    pass
+
+
+class NodeResponseError(NodeError):
+    # the node's answer isn't a valid JSON-RPC response, which is usually
+    # caused by `api_secret_path` being set in grin-server.toml
+    pass
+
+
+class NodeRPCError(NodeError):
+    # the node answered, but with an error for this call
+    def __init__(self, method, error):
+        super().__init__(method, error)
+        self.method = method
+        self.error = error
+
+    def __str__(self):
+        return "{} failed: {}".format(self.method, self.error)
+
+
+class NodeClient:
+    """
+    Client for the JSON-RPC foreign API (`/v2/foreign`) of a Grin node.
+
+    All calls go through one keep-alive session holding up to `pool_size`
+    connections, so it can be shared by several threads. Calls failing
+    because of connection errors, timeouts or server errors are retried up
+    to `retries` times with jittered exponential backoff.
+    """
+
+    def __init__(self, url, timeout=30, retries=5, backoff=0.5, pool_size=10):
+        self.url = "%s/v2/foreign" % url.rstrip("/")
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def call(self, method, **params):
+        resp = self._post({
+            "jsonrpc": "2.0",
+            "id": 0,
+            "method": method,
+            "params": params,
+        })
+
+        return self._result(method, resp)
+
+    def batch(self, calls):
+        # Sends all (method, params) tuples of `calls` in a single request
+        # and returns their results in the same order
+        if not calls:
+            return []
+
+        resp = self._post([
+            {
+                "jsonrpc": "2.0",
+                "id": id,
+                "method": method,
+                "params": params,
+            }
+            for (id, (method, params)) in enumerate(calls)
+        ])
+
+        if not isinstance(resp, list):
+            # the node rejects the batch as a whole
+            return [self._result(calls[0][0], resp)]
+
+        by_id = {r.get("id"): r for r in resp if isinstance(r, dict)}
+        results = []
+        for (id, (method, _)) in enumerate(calls):
+            if id not in by_id:
+                raise NodeResponseError(
+                    "No response for {} in batch: {!r}".format(method, resp))
+            results.append(self._result(method, by_id[id]))
+
+        return results
+
+    def _post(self, payload):
+        attempt = 0
+        while True:
+            try:
+                resp = self.session.post(self.url, json=payload, timeout=self.timeout)
+                if resp.status_code < 500:
+                    break
+                error = "HTTP {}".format(resp.status_code)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                error = e
+
+            if attempt >= self.retries:
+                raise NodeUnavailable("{} unavailable: {}".format(self.url, error))
+
+            time.sleep(self.backoff * 2 ** attempt * random.uniform(0.5, 1.5))
+            attempt += 1
+
+        try:
+            return resp.json()
+        except ValueError:
+            raise NodeResponseError(
+                "Decoding JSON failed (HTTP {}): {!r}".format(resp.status_code, resp.text[:200]))
+
+    def _result(self, method, resp):
+        if isinstance(resp, dict) and "error" in resp:
+            raise NodeRPCError(method, resp["error"])
+
+        result = resp.get("result") if isinstance(resp, dict) else None
+        if not isinstance(result, dict) or not ("Ok" in result or "Err" in result):
+            raise NodeResponseError("Unexpected response to {}: {!r}".format(method, resp))
+
+        if "Err" in result:
+            raise NodeRPCError(method, result["Err"])
+
+        return result["Ok"]
@@ -0,0 +1,22 @@
+from django.db import connection
+from django.dispatch import Signal
+
+# Sent by the importer once a batch of blocks has been committed, with the
+# hashes of the new blocks as `hashes`.
+blocks_stored = Signal()
+
+# Sent by `import_from_tip --follow` when the node's new tip doesn't build on
+# the previous one: `tip` is the hash of the previous tip and `fork_point`
+# the hash of the last block it has in common with the new chain.
+chain_reorged = Signal()
+
+# PostgreSQL channel the importer NOTIFYs with the hash of each stored block.
+# Unlike the signals above, this reaches the web server's processes too, once
+# the batch is committed.
+BLOCKS_CHANNEL = "blockchain_blocks"
+
+
+def notify_blocks_stored(hashes):
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT pg_notify(%s, hash) FROM unnest(%s::text[]) AS hash",
+                       [BLOCKS_CHANNEL, hashes])
@@ -0,0 +1,191 @@
+import hashlib
+import json
+import threading
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+GENESIS_PREVIOUS = "ffffffffffffffffffffffffffffffffffffffffffffffffffffffffffffffff"
+GENESIS_TIME = datetime(2019, 1, 15, 16, 1, 26, tzinfo=timezone.utc)
+
+
+def fake_hex(*parts, length=64):
+    # deterministic pseudo-random hex string of `length` characters
+    seed = ":".join(str(part) for part in parts).encode()
+    digest = ""
+    counter = 0
+    while len(digest) < length:
+        digest += hashlib.blake2b(seed + str(counter).encode()).hexdigest()
+        counter += 1
+
+    return digest[:length]
+
+
+class SyntheticChain:
+    """
+    Chain of `length` blocks in the format of the node's `get_block`, each
+    with the given number of inputs, outputs and kernels. Inputs spend the
+    outputs of earlier blocks. Blocks are generated when requested.
+    """
+
+    def __init__(self, length, inputs=2, outputs=3, kernels=2):
+        self.length = length
+        self.inputs = inputs
+        self.outputs = outputs
+        self.kernels = kernels
+        self.hashes = [fake_hex("block", height) for height in range(length)]
+        self.heights = {hash: height for (height, hash) in enumerate(self.hashes)}
+
+    def tip(self):
+        height = self.length - 1
+        return {
+            "height": height,
+            "last_block_pushed": self.hashes[height],
+            "prev_block_to_last": self.hashes[height - 1] if height else GENESIS_PREVIOUS,
+            "total_difficulty": self.total_difficulty(height),
+        }
+
+    def total_difficulty(self, height):
+        return 1000 * (height + 1)
+
+    def commit(self, height, index):
+        return "08" + fake_hex("commit", height, index)
+
+    def block(self, height=None, hash=None):
+        if hash is not None:
+            height = self.heights.get(hash)
+        if height is None or not 0 <= height < self.length:
+            return None
+
+        timestamp = GENESIS_TIME + timedelta(seconds=60 * height)
+        header = {
+            "hash": self.hashes[height],
+            "version": 2,
+            "height": height,
+            "previous": self.hashes[height - 1] if height else GENESIS_PREVIOUS,
+            "prev_root": fake_hex("prev_root", height),
+            "timestamp": timestamp.isoformat(),
+            "output_root": fake_hex("output_root", height),
+            "output_mmr_size": (height + 1) * self.outputs * 2,
+            "range_proof_root": fake_hex("range_proof_root", height),
+            "kernel_root": fake_hex("kernel_root", height),
+            "kernel_mmr_size": (height + 1) * self.kernels * 2,
+            "nonce": int(fake_hex("nonce", height, length=12), 16),
+            "edge_bits": 29 if height % 2 else 31,
+            "cuckoo_solution": [
+                int(fake_hex("solution", height, i, length=7), 16) for i in range(42)
+            ],
+            "total_difficulty": self.total_difficulty(height),
+            "secondary_scaling": 1856,
+            "total_kernel_offset": fake_hex("offset", height),
+        }
+
+        # spend outputs of the previous block (the genesis block has none)
+        inputs = [
+            self.commit(height - 1, index)
+            for index in range(min(self.inputs, self.outputs))
+        ] if height else []
+
+        outputs = [
+            {
+                "output_type": "Coinbase" if index == 0 else "Transaction",
+                "commit": self.commit(height, index),
+                "spent": False,
+                "proof": fake_hex("proof", height, index, length=1350),
+                "proof_hash": fake_hex("proof_hash", height, index),
+                "block_height": height,
+                "merkle_proof": None,
+                "mmr_index": height * self.outputs + index + 1,
+            }
+            for index in range(self.outputs)
+        ]
+
+        kernels = [
+            {
+                "features": "Coinbase" if index == 0 else "Plain",
+                "fee": 0 if index == 0 else 8000000,
+                "fee_shift": 0,
+                "lock_height": 0,
+                "excess": "09" + fake_hex("excess", height, index),
+                "excess_sig": fake_hex("excess_sig", height, index, length=128),
+            }
+            for index in range(self.kernels)
+        ]
+
+        return {
+            "header": header,
+            "inputs": inputs,
+            "outputs": outputs,
+            "kernels": kernels,
+        }
+
+
+class StubNode:
+    """
+    Serves the `get_tip` and `get_block` methods of the node's JSON-RPC
+    foreign API (`/v2/foreign`, including batch requests) for a
+    `SyntheticChain` on localhost. `http_requests` and `rpc_calls` count the
+    requests served.
+    """
+
+    def __init__(self, chain):
+        self.chain = chain
+        self.http_requests = 0
+        self.rpc_calls = 0
+        self.lock = threading.Lock()
+
+        node = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+
+                if isinstance(payload, list):
+                    resp = [node.handle_call(call) for call in payload]
+                else:
+                    resp = node.handle_call(payload)
+
+                with node.lock:
+                    node.http_requests += 1
+
+                body = json.dumps(resp).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+
+    @property
+    def url(self):
+        return "http://127.0.0.1:{}".format(self.server.server_port)
+
+    def handle_call(self, call):
+        with self.lock:
+            self.rpc_calls += 1
+
+        params = call.get("params") or {}
+        if call["method"] == "get_tip":
+            result = {"Ok": self.chain.tip()}
+        elif call["method"] == "get_block":
+            block = self.chain.block(height=params.get("height"), hash=params.get("hash"))
+            result = {"Ok": block} if block is not None else {"Err": "NotFound"}
+        else:
+            return {
+                "jsonrpc": "2.0",
+                "id": call.get("id"),
+                "error": {"code": -32601, "message": "Method not found"},
+            }
+
+        return {"jsonrpc": "2.0", "id": call.get("id"), "result": result}
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
@@ -1,3 +1,308 @@
-from django.test import TestCase
+import threading
+import time
 
-# Create your tests here.
+from django.test import SimpleTestCase, TestCase
+
+from blockchain.fields import is_hex, prefix_range
+from blockchain.importer import BlockPipeline, BlockWriter, common_ancestor
+from blockchain.models import Block, Output
+from blockchain.stubnode import GENESIS_PREVIOUS, SyntheticChain, fake_hex
+
+
+class ForkedChain(SyntheticChain):
+    # a chain sharing the blocks below `fork_height` with SyntheticChain
+    def __init__(self, length, fork_height, **kwargs):
+        super().__init__(length, **kwargs)
+        self.hashes = [
+            hash if height < fork_height else fake_hex("fork", height)
+            for (height, hash) in enumerate(self.hashes)
+        ]
+        self.heights = {hash: height for (height, hash) in enumerate(self.hashes)}
+
+
+class BlockPipelineTests(SimpleTestCase):
+    def test_yields_in_key_order(self):
+        def fetch(keys):
+            # later chunks finish first
+            time.sleep(0.01 * (10 - keys[0] % 10))
+            return [key * 2 for key in keys]
+
+        pipeline = BlockPipeline(fetch, range(100), workers=8, queue_depth=16, chunk_size=3)
+
+        self.assertEqual(list(pipeline), [key * 2 for key in range(100)])
+
+    def test_chunks(self):
+        chunks = []
+
+        def fetch(keys):
+            chunks.append(list(keys))
+            return keys
+
+        list(BlockPipeline(fetch, range(10), workers=1, chunk_size=4))
+
+        self.assertEqual(chunks, [[0, 1, 2, 3], [4, 5, 6, 7], [8, 9]])
+
+    def test_stops_fetching_when_consumer_stops(self):
+        fetched = []
+        lock = threading.Lock()
+
+        def fetch(keys):
+            with lock:
+                fetched.extend(keys)
+            return keys
+
+        pipeline = BlockPipeline(fetch, range(10000), workers=2, queue_depth=8, chunk_size=2)
+        for key in pipeline:
+            if key == 5:
+                break
+
+        # only what fits in the queue and the workers is fetched ahead
+        self.assertLess(len(fetched), 100)
+
+    def test_propagates_errors(self):
+        def fetch(keys):
+            if 6 in keys:
+                raise ValueError("failed")
+            return keys
+
+        consumed = []
+        with self.assertRaises(ValueError):
+            for key in BlockPipeline(fetch, range(20), workers=4, chunk_size=2):
+                consumed.append(key)
+
+        self.assertEqual(consumed, [0, 1, 2, 3, 4, 5])
+
+
+class BlockWriterTests(TestCase):
+    chain = SyntheticChain(30)
+
+    def write(self, heights, batch_size=7, writer=None):
+        if writer is None:
+            writer = BlockWriter(batch_size=batch_size)
+        for height in heights:
+            writer.add(self.chain.block(height=height))
+        writer.flush()
+        return writer
+
+    def assertChainStored(self):
+        blocks = {
+            blk.height: blk
+            for blk in Block.objects.all()
+        }
+        self.assertEqual(len(blocks), self.chain.length)
+
+        self.assertIsNone(blocks[0].previous_id)
+        self.assertIsNone(blocks[0].target_difficulty)
+        for height in range(1, self.chain.length):
+            self.assertEqual(blocks[height].previous_id, self.chain.hashes[height - 1])
+            self.assertEqual(blocks[height].target_difficulty, 1000)
+
+        # the first two outputs of each block are spent by the next one
+        for output in Output.objects.select_related("block"):
+            height = output.block.height
+            if output.mmr_index - height * self.chain.outputs <= 2 and height + 1 < self.chain.length:
+                self.assertTrue(output.spent)
+                self.assertEqual(output.spent_block_id, self.chain.hashes[height + 1])
+                self.assertEqual(output.spent_height, height + 1)
+            else:
+                self.assertFalse(output.spent)
+                self.assertIsNone(output.spent_block_id)
+
+    def test_ascending(self):
+        writer = self.write(range(30))
+
+        self.assertChainStored()
+        self.assertEqual(writer.unlinked, {self.chain.hashes[0]: GENESIS_PREVIOUS})
+
+    def test_descending(self):
+        writer = self.write(range(29, -1, -1))
+
+        self.assertChainStored()
+        self.assertEqual(writer.unlinked, {self.chain.hashes[0]: GENESIS_PREVIOUS})
+
+    def test_single_batch(self):
+        self.write(range(29, -1, -1), batch_size=100)
+
+        self.assertChainStored()
+
+    def test_previous_stored_before(self):
+        self.write(range(15))
+        self.write(range(15, 30))
+
+        self.assertChainStored()
+
+    def test_shards(self):
+        # like `import_from_tip --from-height`: each shard is written
+        # separately, the later one first, and the links between them are
+        # stored at the end
+        shards = [self.write(range(15, 30)), self.write(range(15))]
+        self.assertIsNone(Block.objects.get(height=15).previous_id)
+
+        writer = BlockWriter()
+        for shard in shards:
+            for (hash, previous) in shard.unlinked.items():
+                writer.link(hash, previous)
+        writer.flush()
+
+        self.assertChainStored()
+
+    def test_existing(self):
+        writer = self.write(range(10))
+        writer.add(self.chain.block(height=10))
+
+        self.assertEqual(
+            writer.existing([self.chain.hashes[5], self.chain.hashes[10], self.chain.hashes[11]]),
+            {self.chain.hashes[5], self.chain.hashes[10]})
+
+
+class RecreatedCommitChain(SyntheticChain):
+    # the first output of block 10 is created again in block 30
+    def commit(self, height, index):
+        if (height, index) == (30, 0):
+            height = 10
+        return super().commit(height, index)
+
+
+class SpentOutputTests(TestCase):
+    def write(self, chain, heights):
+        writer = BlockWriter(batch_size=7)
+        for height in heights:
+            writer.add(chain.block(height=height))
+        writer.flush()
+
+    def spent(self, chain, height):
+        output = Output.objects.get(commit=chain.commit(10, 0), block__height=height)
+        return (output.spent, output.spent_height)
+
+    def test_recreated_unspent(self):
+        chain = RecreatedCommitChain(31)
+        self.write(chain, range(31))
+
+        self.assertEqual(self.spent(chain, 10), (True, 11))
+        self.assertEqual(self.spent(chain, 30), (False, None))
+
+    def test_recreated_unspent_descending(self):
+        chain = RecreatedCommitChain(31)
+        self.write(chain, range(30, -1, -1))
+
+        self.assertEqual(self.spent(chain, 10), (True, 11))
+        self.assertEqual(self.spent(chain, 30), (False, None))
+
+    def test_recreated_spent(self):
+        chain = RecreatedCommitChain(32)
+        self.write(chain, range(32))
+
+        self.assertEqual(self.spent(chain, 10), (True, 11))
+        self.assertEqual(self.spent(chain, 30), (True, 31))
+
+    def test_recreated_spent_descending(self):
+        chain = RecreatedCommitChain(32)
+        self.write(chain, range(31, -1, -1))
+
+        self.assertEqual(self.spent(chain, 10), (True, 11))
+        self.assertEqual(self.spent(chain, 30), (True, 31))
+
+    def test_recreated_spent_inputs_first(self):
+        # both spending blocks are stored before both outputs
+        chain = RecreatedCommitChain(32)
+        self.write(chain, [31, 11] + [height for height in range(32) if height not in (11, 31)])
+
+        self.assertEqual(self.spent(chain, 10), (True, 11))
+        self.assertEqual(self.spent(chain, 30), (True, 31))
+
+
+class CommonAncestorTests(TestCase):
+    chain = SyntheticChain(30)
+    fork = ForkedChain(28, fork_height=25)
+
+    def setUp(self):
+        writer = BlockWriter(batch_size=100)
+        for height in range(30):
+            writer.add(self.chain.block(height=height))
+        for height in range(25, 28):
+            writer.add(self.fork.block(height=height))
+        writer.flush()
+
+    def test_fork(self):
+        self.assertEqual(common_ancestor(self.chain.hashes[29], self.fork.hashes[27]),
+                         self.chain.hashes[24])
+        self.assertEqual(common_ancestor(self.fork.hashes[25], self.chain.hashes[29]),
+                         self.chain.hashes[24])
+
+    def test_same_chain(self):
+        self.assertEqual(common_ancestor(self.chain.hashes[20], self.chain.hashes[29]),
+                         self.chain.hashes[20])
+        self.assertEqual(common_ancestor(self.chain.hashes[29], self.chain.hashes[20]),
+                         self.chain.hashes[20])
+        self.assertEqual(common_ancestor(self.chain.hashes[29], self.chain.hashes[29]),
+                         self.chain.hashes[29])
+
+    def test_unknown_block(self):
+        self.assertIsNone(common_ancestor(self.chain.hashes[29], fake_hex("unknown")))
+
+
+class HexFieldTests(TestCase):
+    hashes = [
+        "00" + "11" * 31,
+        "ab" + "00" * 31,
+        "abc0" + "11" * 30,
+        "abd0" + "11" * 30,
+        "ab" + "ff" * 31,
+        "ac" + "00" * 31,
+        "ff" * 32,
+    ]
+
+    @classmethod
+    def setUpTestData(cls):
+        chain = SyntheticChain(1)
+        writer = BlockWriter(batch_size=100)
+        for hash in cls.hashes:
+            block_data = chain.block(height=0)
+            block_data["header"]["hash"] = hash
+            block_data["outputs"] = []
+            block_data["kernels"] = []
+            writer.add(block_data)
+        writer.flush()
+
+    def startswith(self, prefix):
+        return sorted(Block.objects.filter(hash__startswith=prefix).values_list("hash", flat=True))
+
+    def test_is_hex(self):
+        self.assertTrue(is_hex("00abCD"))
+        self.assertTrue(is_hex(""))
+        self.assertFalse(is_hex("abc"))
+        self.assertTrue(is_hex("abc", prefix=True))
+        self.assertFalse(is_hex("abcg", prefix=True))
+
+    def test_prefix_range(self):
+        self.assertEqual(prefix_range("ab"), (b"\xab", b"\xac"))
+        # odd length
+        self.assertEqual(prefix_range("abc"), (b"\xab\xc0", b"\xab\xd0"))
+        self.assertEqual(prefix_range("f"), (b"\xf0", None))
+        # trailing ff carries over
+        self.assertEqual(prefix_range("abff"), (b"\xab\xff", b"\xac"))
+        self.assertEqual(prefix_range("abf"), (b"\xab\xf0", b"\xac"))
+        # no upper bound
+        self.assertEqual(prefix_range("ffff"), (b"\xff\xff", None))
+        self.assertEqual(prefix_range(""), (b"", None))
+
+    def test_round_trip(self):
+        for hash in self.hashes:
+            self.assertEqual(Block.objects.get(hash=hash).hash, hash)
+        self.assertEqual(Block.objects.get(hash=self.hashes[1].upper()).hash, self.hashes[1])
+
+        self.assertEqual(
+            sorted(Block.objects.filter(hash__in=self.hashes[:3]).values_list("hash", flat=True)),
+            self.hashes[:3])
+
+    def test_startswith(self):
+        self.assertEqual(self.startswith("ab"), self.hashes[1:5])
+        self.assertEqual(self.startswith("abc"), [self.hashes[2]])
+        self.assertEqual(self.startswith("abff"), [self.hashes[4]])
+        self.assertEqual(self.startswith("a"), self.hashes[1:6])
+        self.assertEqual(self.startswith("ff"), [self.hashes[6]])
+        self.assertEqual(self.startswith("f"), [self.hashes[6]])
+        self.assertEqual(self.startswith("00"), [self.hashes[0]])
+        self.assertEqual(self.startswith(""), self.hashes)
+        self.assertEqual(self.startswith(self.hashes[5]), [self.hashes[5]])
+        self.assertEqual(self.startswith("abe"), [])
@@ -0,0 +1,144 @@
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import JsonResponse, StreamingHttpResponse
+
+from blockchain.models import Block, Input, Kernel, Output
+
+from .views import MAX_HEIGHT
+
+# version of the API, part of its URLs
+API_VERSION = "v1"
+
+BLOCK_FIELDS = (
+    "hash", "height", "previous_id", "version", "timestamp", "prev_root",
+    "output_root", "range_proof_root", "kernel_root", "output_mmr_size",
+    "kernel_mmr_size", "nonce", "edge_bits", "cuckoo_solution", "difficulty",
+    "target_difficulty", "total_difficulty", "secondary_scaling",
+    "total_kernel_offset", "input_count", "output_count", "kernel_count",
+    "fee_total",
+)
+
+OUTPUT_FIELDS = (
+    "commit", "output_type", "proof_hash", "mmr_index", "spent",
+    "spent_block_id", "spent_height",
+)
+
+KERNEL_FIELDS = (
+    "excess", "excess_sig", "features", "fee", "fee_shift", "lock_height",
+)
+
+# rows fetched from the server-side cursor at once when streaming
+STREAM_CHUNK_SIZE = 2000
+
+
+def rename(row):
+    # `previous_id` -> `previous` etc., as the node names them
+    return {
+        (key[:-3] if key.endswith("_id") else key): value
+        for (key, value) in row.items()
+    }
+
+
+def error(status, message):
+    return JsonResponse({"error": message}, status=status)
+
+
+def block_data(hash):
+    block = Block.objects.filter(hash=hash).values(*BLOCK_FIELDS).first()
+    if block is None:
+        return None
+
+    block = rename(block)
+    block["inputs"] = list(Input.objects.filter(block_id=hash)
+                                        .order_by("id")
+                                        .values_list("data", flat=True))
+    block["outputs"] = [
+        rename(output)
+        for output in Output.objects.filter(block_id=hash).order_by("id").values(*OUTPUT_FIELDS)
+    ]
+    block["kernels"] = list(Kernel.objects.filter(block_id=hash)
+                                          .order_by("id")
+                                          .values(*KERNEL_FIELDS))
+
+    return block
+
+
+def block(request, hash):
+    data = block_data(hash)
+    if data is None:
+        return error(404, "Block not found")
+
+    return JsonResponse(data)
+
+
+def blocks_by_height(request, height):
+    # there can be several blocks at a height, heaviest chain first
+    if height > MAX_HEIGHT:
+        return JsonResponse([], safe=False)
+
+    hashes = Block.objects.filter(height=height) \
+                          .order_by("-total_difficulty") \
+                          .values_list("hash", flat=True)
+
+    return JsonResponse([block_data(hash) for hash in hashes], safe=False)
+
+
+def block_range(request):
+    # Streams the headers of the blocks from the height `from` to `to`
+    # (inclusive) as a JSON array, reading them from a server-side cursor
+    try:
+        start = int(request.GET["from"])
+        end = int(request.GET["to"])
+    except (KeyError, ValueError):
+        return error(400, "`from` and `to` have to be block heights")
+
+    if start > end:
+        return error(400, "`from` has to be lower than or equal to `to`")
+    end = min(end, MAX_HEIGHT)
+
+    blocks = Block.objects.filter(height__range=(start, end)) \
+                          .order_by("height", "-total_difficulty") \
+                          .values(*BLOCK_FIELDS)
+    # the rows are read after the view returns, so pin the database chosen
+    # for the request
+    blocks = blocks.using(blocks.db).iterator(chunk_size=STREAM_CHUNK_SIZE)
+
+    def stream():
+        yield "["
+        for (i, block) in enumerate(blocks):
+            yield (",\n" if i else "\n") + json.dumps(rename(block), cls=DjangoJSONEncoder)
+        yield "\n]\n"
+
+    return StreamingHttpResponse(stream(), content_type="application/json")
+
+
+def output(request, commit):
+    outputs = list(Output.objects.filter(commit=commit)
+                                 .order_by("-id")
+                                 .values("block_id", "block__height", *OUTPUT_FIELDS))
+    if not outputs:
+        return error(404, "Output not found")
+
+    data = rename(outputs[0])
+    data["block_height"] = data.pop("block__height")
+    data["occurrences"] = len(outputs)
+
+    return JsonResponse(data)
+
+
+def kernel(request, excess):
+    kernels = list(Kernel.objects.filter(excess=excess)
+                                 .order_by("-block__total_difficulty")
+                                 .values("block_id", "block__height", *KERNEL_FIELDS))
+    if not kernels:
+        return error(404, "Kernel not found")
+
+    data = {key: kernels[0][key] for key in KERNEL_FIELDS}
+    # the same kernel can be part of competing blocks, heaviest chain first
+    data["blocks"] = [
+        {"hash": k["block_id"], "height": k["block__height"]}
+        for k in kernels
+    ]
+
+    return JsonResponse(data)
@@ -3,3 +3,12 @@ from django.apps import AppConfig
 
 class ExplorerConfig(AppConfig):
     name = 'explorer'
+
+    def ready(self):
+        from blockchain.signals import blocks_stored, chain_reorged
+        from .cache import evict_branch_fragments, invalidate_tip, warm_block_fragments
+
+        # the tip has to be invalidated before the fragments are warmed
+        blocks_stored.connect(invalidate_tip)
+        blocks_stored.connect(warm_block_fragments)
+        chain_reorged.connect(evict_branch_fragments)
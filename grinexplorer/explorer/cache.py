@@ -0,0 +1,124 @@
+import hashlib
+from calendar import timegm
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+from django.db.models import Max
+from django.template.loader import render_to_string
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+from blockchain.models import Block
+
+from .replicas import primary
+
+TIP_CACHE_KEY = "explorer:tip"
+
+
+def get_tip():
+    # Returns the hash and height of the block with the highest total
+    # difficulty. It's cached until the importer stores new blocks, or for
+    # EXPLORER_TIP_CACHE_TIMEOUT seconds if the importer can't reach this
+    # process's cache (e.g. with the local-memory backend). It's always read
+    # from the primary, as replicas may be behind.
+    tip = cache.get(TIP_CACHE_KEY)
+
+    if tip is None:
+        with primary():
+            tip = Block.objects.order_by("-total_difficulty") \
+                               .values("hash", "height") \
+                               .first()
+        if tip is not None:
+            cache.set(TIP_CACHE_KEY, tip, settings.EXPLORER_TIP_CACHE_TIMEOUT)
+
+    return tip
+
+
+def invalidate_tip(sender, **kwargs):
+    cache.delete(TIP_CACHE_KEY)
+
+
+def block_fragment_keys(blk):
+    # the keys of the fragments cached by explorer/block_row.html and
+    # explorer/block_body.html
+    return [
+        make_template_fragment_key("block-row:1", [blk.hash, blk.target_difficulty]),
+        make_template_fragment_key(
+            "block-body:1", [blk.hash, blk.previous_id, blk.target_difficulty]),
+    ]
+
+
+def warm_block_fragments(sender, hashes, **kwargs):
+    # Renders the cached fragments of the newly stored blocks near the tip,
+    # which are about to be shown on the front page. Batches of older blocks,
+    # e.g. of a backfill, are skipped after looking up the highest heights.
+    blocks = Block.objects.filter(hash__in=hashes)
+    highest = blocks.aggregate(Max("height"))["height__max"]
+    if highest is None:
+        return
+
+    lowest_warmed = Block.objects.aggregate(Max("height"))["height__max"] - settings.EXPLORER_WARM_DEPTH
+    if highest <= lowest_warmed:
+        return
+
+    for blk in blocks.filter(height__gt=lowest_warmed):
+        render_to_string("explorer/block_row.html", {"blk": blk})
+        render_to_string("explorer/block_body.html", {"blk": blk})
+
+
+def evict_branch_fragments(sender, fork_point, tip, **kwargs):
+    # Drops the cached fragments of the blocks on the branch which has been
+    # replaced by a reorg, they're unlikely to be requested anymore. The walk
+    # stops above the fork point's height, even if the branch doesn't lead
+    # to it.
+    branch = Block.objects.raw(
+        "WITH RECURSIVE branch AS ("
+        "  SELECT * FROM blockchain_block WHERE hash = %s "
+        "  UNION ALL "
+        "  SELECT b.* FROM blockchain_block AS b JOIN branch ON b.hash = branch.previous_id "
+        "  WHERE branch.previous_id <> %s "
+        "  AND b.height > (SELECT height FROM blockchain_block WHERE hash = %s)"
+        ") SELECT * FROM branch",
+        [bytes.fromhex(tip), bytes.fromhex(fork_point), bytes.fromhex(fork_point)])
+
+    cache.delete_many([key for blk in branch for key in block_fragment_keys(blk)])
+
+
+def conditional_response(request, render, etag_parts, height=None, last_modified=None):
+    """
+    Answers conditional requests for a page whose content is identified by
+    `etag_parts` with 304 Not Modified, and renders it by calling `render()`
+    otherwise.
+
+    Pages about blocks at least EXPLORER_CONFIRMATION_DEPTH blocks below the
+    tip (`height` being the height of the block, or None if the page may
+    change anyway) are cached for EXPLORER_CONFIRMED_MAX_AGE seconds and
+    carry `last_modified`; all other pages are cached for
+    EXPLORER_UNCONFIRMED_MAX_AGE seconds.
+    """
+    etag = quote_etag(hashlib.md5(repr(etag_parts).encode()).hexdigest())
+
+    tip = get_tip()
+    confirmed = height is not None and tip is not None and \
+        tip["height"] - height >= settings.EXPLORER_CONFIRMATION_DEPTH
+
+    if confirmed and last_modified is not None:
+        last_modified = timegm(last_modified.utctimetuple())
+    else:
+        last_modified = None
+
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        response = render()
+
+    response["ETag"] = etag
+    if last_modified is not None:
+        response["Last-Modified"] = http_date(last_modified)
+
+    if confirmed:
+        patch_cache_control(response, public=True, max_age=settings.EXPLORER_CONFIRMED_MAX_AGE)
+    else:
+        patch_cache_control(response, public=True, max_age=settings.EXPLORER_UNCONFIRMED_MAX_AGE)
+
+    return response
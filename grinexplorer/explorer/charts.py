@@ -2,7 +2,7 @@ from django.db.models import Count, Max, Min
 from django.db.models.functions import TruncDay
 from django.shortcuts import render_to_response
 
-from blockchain.models import Block, Output
+from blockchain.models import DailyStats
 from chartit import DataPool, Chart
 
 
@@ -10,11 +10,9 @@ def block_chart(_):
     blockpivotdata = DataPool(
         series=[{
             'options': {
-                'source': Block.objects.raw("select 1 as hash, "
-                                            "max(total_difficulty) as total_difficulty, "
-                                            "date(DATE_TRUNC('day', timestamp)) as date, count(hash) as blocks "
-                                            "from blockchain_block "
-                                            "group by DATE_TRUNC('day', timestamp) order by date")
+                'source': DailyStats.objects.raw("select date, blocks, "
+                                                 "max_total_difficulty as total_difficulty "
+                                                 "from blockchain_dailystats order by date")
             },
             'terms': [
                 'date',
@@ -107,11 +105,8 @@ def fee_chart(_):
     feepivotdata = DataPool(
         series=[{
             'options': {
-                'source': Block.objects.raw("select 1 as hash, "
-                                            "date(DATE_TRUNC('day', timestamp)) as date, sum(fee)/1000000 as fee "
-                                            "from blockchain_block t1 join blockchain_kernel t2 "
-                                            "on t2.block_id=t1.hash "
-                                            "group by DATE_TRUNC('day', timestamp) order by date")
+                'source': DailyStats.objects.raw("select date, fees/1000000 as fee "
+                                                 "from blockchain_dailystats order by date")
             },
             'terms': [
                 'date',
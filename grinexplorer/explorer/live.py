@@ -0,0 +1,141 @@
+import json
+import logging
+import queue
+import select
+import threading
+import time
+
+import psycopg2
+from django.db import DatabaseError, connection, connections
+from django.http import StreamingHttpResponse
+from django.template.loader import render_to_string
+
+from blockchain.models import Block
+from blockchain.signals import BLOCKS_CHANNEL
+
+logger = logging.getLogger(__name__)
+
+# seconds between keep-alive comments sent to idle clients, which also lets
+# the server notice clients that went away
+KEEPALIVE_INTERVAL = 15
+
+# seconds before reconnecting after losing the listening connection, also
+# sent to the browsers as their reconnection delay
+RECONNECT_DELAY = 5
+
+# events buffered for a client that doesn't keep up, newer ones are dropped
+CLIENT_QUEUE_SIZE = 100
+
+# newest blocks of a batch pushed to the clients, as many as the front page
+# shows, so a resync doesn't flood them
+PUSHED_BLOCKS = 20
+
+
+def block_events(hashes):
+    # the server-sent events of the newly stored blocks, oldest first so the
+    # clients can prepend them one by one
+    blocks = list(Block.objects.filter(hash__in=hashes)
+                               .order_by("-height", "-hash")[:PUSHED_BLOCKS])
+
+    return [
+        "event: block\ndata: {}\n\n".format(json.dumps({
+            "hash": blk.hash,
+            "height": blk.height,
+            "row": render_to_string("explorer/block_row.html", {"blk": blk}).strip(),
+        }))
+        for blk in reversed(blocks)
+    ]
+
+
+class BlockListener:
+    """
+    Shares a single LISTEN connection between all the clients of a process: a
+    thread waits for the importer's notifications, renders the new blocks once
+    and hands the events to the queue of each client.
+    """
+
+    def __init__(self):
+        self.clients = set()
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def subscribe(self):
+        client = queue.Queue(CLIENT_QUEUE_SIZE)
+
+        with self.lock:
+            self.clients.add(client)
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, name="block-listener", daemon=True)
+                self.thread.start()
+
+        return client
+
+    def unsubscribe(self, client):
+        with self.lock:
+            self.clients.discard(client)
+
+    def publish(self, events):
+        with self.lock:
+            clients = list(self.clients)
+
+        for client in clients:
+            for event in events:
+                try:
+                    client.put_nowait(event)
+                except queue.Full:
+                    break
+
+    def run(self):
+        while True:
+            try:
+                self.listen()
+            except (psycopg2.Error, DatabaseError) as e:
+                logger.warning("Lost the connection listening for new blocks: %s", e)
+                connection.close()
+
+            time.sleep(RECONNECT_DELAY)
+
+    def listen(self):
+        conn = psycopg2.connect(**connections["default"].get_connection_params())
+        try:
+            conn.autocommit = True
+            with conn.cursor() as cursor:
+                cursor.execute("LISTEN {}".format(BLOCKS_CHANNEL))
+
+            while True:
+                if select.select([conn], [], [], KEEPALIVE_INTERVAL) == ([], [], []):
+                    continue
+
+                conn.poll()
+                hashes = [notify.payload for notify in conn.notifies]
+                conn.notifies.clear()
+
+                if hashes:
+                    self.publish(block_events(hashes))
+        finally:
+            conn.close()
+
+
+listener = BlockListener()
+
+
+def block_stream(request):
+    # Server-sent events with the rows of the front page's block list for the
+    # blocks stored from now on
+    def stream():
+        client = listener.subscribe()
+        try:
+            yield "retry: {}\n\n".format(RECONNECT_DELAY * 1000)
+            while True:
+                try:
+                    yield client.get(timeout=KEEPALIVE_INTERVAL)
+                except queue.Empty:
+                    yield ": keep-alive\n\n"
+        finally:
+            listener.unsubscribe(client)
+
+    response = StreamingHttpResponse(stream(), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    # stop nginx from buffering the events
+    response["X-Accel-Buffering"] = "no"
+    return response
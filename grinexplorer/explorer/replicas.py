@@ -0,0 +1,106 @@
+import contextvars
+import random
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DatabaseError, connections
+
+# the replica the reads of the current request go to, None for the primary
+current_replica = contextvars.ContextVar("current_replica", default=None)
+
+# seconds the standby has yet to replay, 0 if it has replayed everything it
+# received, so an idle primary doesn't make it look behind
+LAG_SQL = """
+    SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+                ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+           END
+"""
+
+# alias -> (time of the last check, whether the replica was usable)
+_health = {}
+
+
+def replica_lag(alias):
+    # None if the replica can't be reached or isn't a standby
+    try:
+        with connections[alias].cursor() as cursor:
+            cursor.execute(LAG_SQL)
+            return cursor.fetchone()[0]
+    except DatabaseError:
+        connections[alias].close()
+        return None
+
+
+def is_usable(alias):
+    # Whether the replica is up and at most EXPLORER_REPLICA_MAX_LAG seconds
+    # behind the primary, checked at most every EXPLORER_REPLICA_CHECK_INTERVAL
+    # seconds per process
+    (checked, usable) = _health.get(alias, (None, False))
+
+    if checked is None or time.monotonic() - checked > settings.EXPLORER_REPLICA_CHECK_INTERVAL:
+        lag = replica_lag(alias)
+        usable = lag is not None and lag <= settings.EXPLORER_REPLICA_MAX_LAG
+        _health[alias] = (time.monotonic(), usable)
+
+    return usable
+
+
+def choose_replica():
+    replicas = [alias for alias in settings.EXPLORER_REPLICAS if is_usable(alias)]
+    return random.choice(replicas) if replicas else None
+
+
+@contextmanager
+def primary():
+    # Sends the reads inside the block to the primary, for queries that have
+    # to see the latest blocks, such as the tip
+    token = current_replica.set(None)
+    try:
+        yield
+    finally:
+        current_replica.reset(token)
+
+
+class ReplicaRouter:
+    """
+    Sends the reads of the explorer's pages to the replica chosen for the
+    request by ReplicaMiddleware. Everything else, including the importer, uses
+    the primary.
+    """
+
+    def db_for_read(self, model, **hints):
+        return current_replica.get()
+
+    def db_for_write(self, model, **hints):
+        return "default"
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == "default"
+
+
+class ReplicaMiddleware:
+    # Picks a replica for each GET and HEAD request. If the page isn't found
+    # there, it's looked up on the primary again, since the replica may not
+    # have the latest blocks yet.
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.EXPLORER_REPLICAS or request.method not in ("GET", "HEAD"):
+            return self.get_response(request)
+
+        token = current_replica.set(choose_replica())
+        try:
+            response = self.get_response(request)
+            if response.status_code == 404 and current_replica.get() is not None:
+                current_replica.set(None)
+                response = self.get_response(request)
+        finally:
+            current_replica.reset(token)
+
+        return response
@@ -1,3 +1,133 @@
+from django.core.cache import cache
 from django.test import TestCase
 
-# Create your tests here.
+from blockchain.importer import BlockWriter
+from blockchain.models import Block
+from blockchain.stubnode import SyntheticChain, fake_hex
+
+from .cache import block_fragment_keys, evict_branch_fragments, warm_block_fragments
+
+
+class BlockListPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        chain = SyntheticChain(45)
+        writer = BlockWriter(batch_size=100)
+        for height in range(45):
+            writer.add(chain.block(height=height))
+
+        # competing blocks at the same heights, to be ordered by hash
+        for height in (20, 25):
+            block_data = chain.block(height=height)
+            block_data["header"]["hash"] = fake_hex("fork", height)
+            block_data["outputs"] = []
+            block_data["kernels"] = []
+            writer.add(block_data)
+        writer.flush()
+
+    def setUp(self):
+        cache.clear()
+
+    def page(self, query=""):
+        response = self.client.get("/" + query)
+        self.assertEqual(response.status_code, 200)
+        return response.context["page_obj"]
+
+    def blocks(self, page):
+        return [(blk.height, blk.hash) for blk in page.object_list]
+
+    def test_pages_forward_and_back(self):
+        pages = [self.page()]
+        while pages[-1].has_next:
+            pages.append(self.page("?before=" + pages[-1].next_cursor))
+
+        self.assertEqual([len(page.object_list) for page in pages], [20, 20, 7])
+        self.assertFalse(pages[0].has_previous)
+        self.assertTrue(pages[-1].has_previous)
+
+        listed = [blk for page in pages for blk in self.blocks(page)]
+        self.assertEqual(listed, sorted(listed, reverse=True))
+        self.assertEqual(len(set(listed)), 47)
+
+        # walking back yields the same pages
+        page = pages[-1]
+        for expected in reversed(pages[:-1]):
+            page = self.page("?after=" + page.previous_cursor)
+            self.assertEqual(self.blocks(page), self.blocks(expected))
+            self.assertTrue(page.has_next)
+        self.assertFalse(page.has_previous)
+
+    def test_invalid_cursor(self):
+        for query in ("?before=abc", "?before=10-xyz", "?after=10"):
+            self.assertEqual(self.client.get("/" + query).status_code, 404)
+
+    def test_past_the_last_block(self):
+        self.assertEqual(self.client.get("/?before=0-00").status_code, 404)
+
+
+class EvictBranchFragmentsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.chain = SyntheticChain(30)
+        writer = BlockWriter(batch_size=100)
+        for height in range(30):
+            writer.add(cls.chain.block(height=height))
+        writer.flush()
+
+    def setUp(self):
+        cache.clear()
+        for blk in Block.objects.all():
+            cache.set_many({key: "fragment" for key in block_fragment_keys(blk)})
+
+    def cached_heights(self):
+        # of the blocks of the chain that was replaced
+        return sorted(
+            blk.height for blk in Block.objects.filter(hash__in=self.chain.hashes)
+            if cache.get_many(block_fragment_keys(blk))
+        )
+
+    def test_evicts_branch(self):
+        evict_branch_fragments(None, fork_point=self.chain.hashes[24], tip=self.chain.hashes[29])
+
+        self.assertEqual(self.cached_heights(), list(range(25)))
+
+    def test_fork_point_not_on_branch(self):
+        # e.g. a block of a competing branch at the height of the fork
+        fork_point = self.chain.block(height=24)
+        fork_point["header"]["hash"] = fake_hex("fork", 24)
+        writer = BlockWriter()
+        writer.add(fork_point)
+        writer.flush()
+
+        evict_branch_fragments(None, fork_point=fake_hex("fork", 24), tip=self.chain.hashes[29])
+
+        self.assertEqual(self.cached_heights(), list(range(25)))
+
+
+class WarmBlockFragmentsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.chain = SyntheticChain(50)
+        writer = BlockWriter(batch_size=100)
+        for height in range(50):
+            writer.add(cls.chain.block(height=height))
+        writer.flush()
+
+    def setUp(self):
+        cache.clear()
+
+    def cached_heights(self):
+        return sorted(
+            blk.height for blk in Block.objects.all()
+            if cache.get_many(block_fragment_keys(blk))
+        )
+
+    def test_near_tip(self):
+        warm_block_fragments(None, hashes=self.chain.hashes[20:])
+
+        self.assertEqual(self.cached_heights(), list(range(30, 50)))
+
+    def test_below_tip(self):
+        warm_block_fragments(None, hashes=self.chain.hashes[:30])
+
+        self.assertEqual(self.cached_heights(), [])
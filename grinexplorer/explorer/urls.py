@@ -1,15 +1,37 @@
-from django.urls import path
+from django.urls import path, register_converter
 
-from .views import BlockList, BlocksByHeight, BlockDetail, OutputByCommit, Search
+from . import api, live
+from .views import BlockList, BlocksByHeight, BlockDetail, KernelByExcess, OutputByCommit, Search
 from .charts import block_chart, fee_chart
 
 
+class HexConverter:
+    # hashes and commitments, which are stored as binary
+    regex = "(?:[0-9a-fA-F]{2})+"
+
+    def to_python(self, value):
+        return value
+
+    def to_url(self, value):
+        return value
+
+
+register_converter(HexConverter, "hex")
+
 urlpatterns = [
     path("", BlockList.as_view(), name="block-list"),
     path("chart/block", block_chart, name="block-chart"),
     path("chart/fee", fee_chart, name="fee-chart"),
     path("block/<int:height>", BlocksByHeight.as_view(), name="blocks-by-height"),
-    path("block/<str:pk>", BlockDetail.as_view(), name="block-detail"),
+    path("block/<hex:pk>", BlockDetail.as_view(), name="block-detail"),
     path("output/<str:commit>", OutputByCommit.as_view(), name="output-detail"),
+    path("kernel/<str:excess>", KernelByExcess.as_view(), name="kernel-detail"),
     path("search", Search.as_view(), name="search"),
+    path("live/blocks", live.block_stream, name="live-blocks"),
+
+    path("api/%s/block/<int:height>" % api.API_VERSION, api.blocks_by_height, name="api-blocks-by-height"),
+    path("api/%s/block/<hex:hash>" % api.API_VERSION, api.block, name="api-block"),
+    path("api/%s/blocks" % api.API_VERSION, api.block_range, name="api-block-range"),
+    path("api/%s/output/<hex:commit>" % api.API_VERSION, api.output, name="api-output"),
+    path("api/%s/kernel/<hex:excess>" % api.API_VERSION, api.kernel, name="api-kernel"),
 ]
@@ -1,31 +1,112 @@
-from django.db.models import Count, Sum, Max, Min
+from functools import partial
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Sum, Max, Min, Q
 from django.db.models.functions import TruncDay
+from django.http import Http404
 from django.views.generic import ListView, DetailView, TemplateView
 from django.urls import reverse
 from django.shortcuts import redirect
 
-from blockchain.models import Block, Input, Output
+from blockchain.fields import is_hex
+from blockchain.models import Block, DailyStats, Kernel, Output, OutputProof
 from chartit import DataPool, Chart
 
+from .cache import conditional_response, get_tip
+from .replicas import primary
+
+# heights above don't fit into the height column
+MAX_HEIGHT = 2**31 - 1
+
+# number of kernels listed when searching by a prefix of their excess
+MAX_KERNEL_RESULTS = 50
+
+
+class KeysetPage:
+    """
+    A page of blocks, ordered by descending height and hash, that starts
+    right after (or ends right before) a given block instead of at an
+    offset. This keeps deep pages as cheap as the first one. Pages are
+    addressed by the cursors `next_cursor` and `previous_cursor`.
+    """
+
+    def __init__(self, object_list, has_previous, has_next):
+        self.object_list = object_list
+        self.has_previous = has_previous
+        self.has_next = has_next
+
+    @staticmethod
+    def cursor(blk):
+        return "{}-{}".format(blk.height, blk.hash)
+
+    @property
+    def previous_cursor(self):
+        return self.cursor(self.object_list[0])
+
+    @property
+    def next_cursor(self):
+        return self.cursor(self.object_list[-1])
+
 
 class BlockList(ListView):
     template_name = "explorer/block_list.html"
     context_object_name = "block_list"
 
-    queryset = Block.objects.order_by("-timestamp") \
-                            .select_related("previous") \
-                            .prefetch_related("output_set", "kernel_set", "input_set")
+    queryset = Block.objects.order_by("-height", "-hash")
     paginate_by = 20
 
+    def parse_cursor(self, cursor):
+        try:
+            (height, hash) = cursor.split("-", 1)
+            if not is_hex(hash):
+                raise ValueError(hash)
+            return (int(height), hash)
+        except ValueError:
+            raise Http404("Invalid cursor")
+
+    def paginate_queryset(self, queryset, page_size):
+        before = self.request.GET.get("before")
+        after = self.request.GET.get("after")
+
+        if after:
+            # newer blocks: seek upwards from the cursor, then flip the page
+            (height, hash) = self.parse_cursor(after)
+            # the redundant bound on the height lets the index scan start at
+            # the cursor
+            blocks = list(queryset.filter(Q(height__gt=height) | Q(height=height, hash__gt=hash),
+                                          height__gte=height)
+                                  .reverse()[:page_size + 1])
+            page = KeysetPage(blocks[:page_size][::-1],
+                              has_previous=len(blocks) > page_size,
+                              has_next=True)
+        else:
+            if before:
+                (height, hash) = self.parse_cursor(before)
+                queryset = queryset.filter(Q(height__lt=height) | Q(height=height, hash__lt=hash),
+                                           height__lte=height)
+
+            blocks = list(queryset[:page_size + 1])
+            page = KeysetPage(blocks[:page_size],
+                              has_previous=bool(before),
+                              has_next=len(blocks) > page_size)
+
+        if not page.object_list:
+            if before or after:
+                raise Http404("No blocks beyond this cursor")
+
+            page.has_previous = page.has_next = False
+
+        return (None, page, page.object_list, page.has_previous or page.has_next)
+
     def get_block_chart(self):
         blockpivotdata = DataPool(
             series=[{
                 'options': {
-                    'source': Block.objects.raw("select 1 as hash, to_char(timestamp,'MM-dd') as niceday, "
-                                                "max(total_difficulty) as total_difficulty, "
-                                                "date(DATE_TRUNC('day', timestamp)) as date, count(hash) as num "
-                                                "from blockchain_block where timestamp > current_date - interval '30 day'"
-                                                "group by DATE_TRUNC('day', timestamp),niceday order by date")
+                    'source': DailyStats.objects.raw("select date, to_char(date,'MM-dd') as niceday, "
+                                                     "max_total_difficulty as total_difficulty, blocks as num "
+                                                     "from blockchain_dailystats where date > current_date - interval '30 day' "
+                                                     "order by date")
                 },
                 'terms': [
                     'niceday',
@@ -120,11 +201,10 @@ class BlockList(ListView):
         feepivotdata = DataPool(
             series=[{
                 'options': {
-                    'source': Block.objects.raw("select 1 as hash, to_char(timestamp,'MM-dd') as niceday, "
-                                                "date(DATE_TRUNC('day', timestamp)) as date, sum(fee)/1000000 as fee "
-                                                "from blockchain_block t1 join blockchain_kernel t2 "
-                                                "on t2.block_id=t1.hash where timestamp > current_date - interval '30 day' "
-                                                "group by DATE_TRUNC('day', timestamp),niceday order by date")
+                    'source': DailyStats.objects.raw("select date, to_char(date,'MM-dd') as niceday, "
+                                                     "fees/1000000 as fee "
+                                                     "from blockchain_dailystats where date > current_date - interval '30 day' "
+                                                     "order by date")
                 },
                 'terms': [
                     'niceday',
@@ -162,27 +242,44 @@ class BlockList(ListView):
         )
         return feepivcht
 
+    def get_dashboard(self):
+        # read from the primary, as it's cached under the current tip
+        with primary():
+            return self.compute_dashboard()
+
+    def compute_dashboard(self):
+        dashboard = {}
+
+        dashboard["highest_block"] = Block.objects.order_by("height").last()
+        dashboard["latest_block"] = Block.objects.order_by("timestamp").last()
+        dashboard["total_emission"] = Block.objects.order_by(
+            "total_difficulty").last().height * 60
+
+        dashboard["competing_chains"] = Block.objects \
+                                             .filter(height__gte=dashboard["highest_block"].height - 60) \
+                                             .values("height") \
+                                             .annotate(cnt=Count("height")) \
+                                             .aggregate(Max("cnt"))["cnt__max"]
+        dashboard["forked_at"] = Block.objects \
+                                      .filter(height__gte=dashboard["highest_block"].height - 60) \
+                                      .values("height") \
+                                      .annotate(cnt=Count("height")) \
+                                      .filter(cnt__gt=1) \
+                                      .aggregate(Min("height"))["height__min"]
+
+        return dashboard
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
 
-        if Block.objects.exists():
-            context["highest_block"] = Block.objects.order_by("height").last()
-            context["latest_block"] = Block.objects.order_by(
-                "timestamp").last()
-            context["total_emission"] = Block.objects.order_by(
-                "total_difficulty").last().height * 60
-
-            context["competing_chains"] = Block.objects \
-                                               .filter(height__gte=context["highest_block"].height - 60) \
-                                               .values("height") \
-                                               .annotate(cnt=Count("height")) \
-                                               .aggregate(Max("cnt"))["cnt__max"]
-            context["forked_at"] = Block.objects \
-                                        .filter(height__gte=context["highest_block"].height - 60) \
-                                        .values("height") \
-                                        .annotate(cnt=Count("height")) \
-                                        .filter(cnt__gt=1) \
-                                        .aggregate(Min("height"))["height__min"]
+        tip = get_tip()
+        if tip is not None:
+            # the dashboard only changes with the tip, so it's computed once
+            # per tip and shared by all requests
+            context.update(cache.get_or_set(
+                "explorer:dashboard:%s" % tip["hash"],
+                self.get_dashboard,
+                settings.EXPLORER_DASHBOARD_CACHE_TIMEOUT))
 
             context['thumb_chart_list'] = [
                 self.get_block_chart(), self.get_fee_chart()]
@@ -195,8 +292,25 @@ class BlockDetail(DetailView):
 
     template_name = "explorer/block_detail.html"
     context_object_name = "blk"
-    queryset = Block.objects.select_related("previous") \
-                            .prefetch_related("output_set", "kernel_set", "input_set")
+
+    def get(self, request, pk):
+        # only what's needed to answer conditional requests; the block's
+        # inputs, outputs and kernels are only loaded if the page isn't
+        # cached (see explorer/block_body.html)
+        block = Block.objects.filter(pk=pk) \
+                             .values("hash", "height", "timestamp", "previous_id",
+                                     "difficulty", "target_difficulty") \
+                             .first()
+        if block is None:
+            raise Http404("No block found matching the query")
+
+        return conditional_response(
+            request,
+            partial(super().get, request, pk=pk),
+            etag_parts=("block", sorted(block.items())),
+            height=block["height"],
+            last_modified=block["timestamp"],
+        )
 
 
 class OutputByCommit(TemplateView):
@@ -206,12 +320,14 @@ class OutputByCommit(TemplateView):
         context = super().get_context_data(**kwargs)
 
         context["output"] = self.output
+        # the proofs are large, so they're only loaded here
+        context["proofs"] = OutputProof.objects.filter(output=self.output).first()
 
         return context
 
     def get(self, request, commit):
         outputs = Output.objects.filter(commit=commit) \
-                                .order_by("-id")
+                                .order_by("-id") if is_hex(commit) else []
 
         if len(outputs) == 0:
             return redirect("%s?q=%s" % (reverse("search"), commit),
@@ -219,12 +335,46 @@ class OutputByCommit(TemplateView):
 
         self.output = outputs[0]
         self.output.occurrences = len(outputs)
-        temp_input = Input.objects.filter(data=commit)
-        if len(temp_input) != 0:
-            # update as spent
-            self.output.spent = True
-            self.output.spent_at = temp_input[0].block.height
-        return super().get(request)
+
+        # the page only stops changing once the output is spent
+        return conditional_response(
+            request,
+            partial(super().get, request),
+            etag_parts=("output", self.output.id, self.output.occurrences,
+                        self.output.spent_block_id),
+            height=self.output.spent_height,
+        )
+
+
+class KernelByExcess(TemplateView):
+    template_name = "explorer/kernel_detail.html"
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+
+        context["kernel"] = self.kernels[0]
+        # the same kernel can be part of competing blocks
+        context["kernels"] = self.kernels
+
+        return context
+
+    def get(self, request, excess):
+        self.kernels = list(Kernel.objects.filter(excess=excess)
+                                          .select_related("block")
+                                          .order_by("-block__total_difficulty")) \
+            if is_hex(excess) else []
+
+        if len(self.kernels) == 0:
+            return redirect("%s?q=%s" % (reverse("search"), excess),
+                            permanent=False)
+
+        return conditional_response(
+            request,
+            partial(super().get, request),
+            etag_parts=("kernel", [(k.id, k.block_id) for k in self.kernels]),
+            height=max(k.block.height for k in self.kernels),
+            last_modified=max(k.block.timestamp for k in self.kernels),
+        )
 
 
 class BlocksByHeight(TemplateView):
@@ -246,12 +396,21 @@ class BlocksByHeight(TemplateView):
         if len(self.blocks) == 1:
             return redirect("block-detail", pk=self.blocks[0].hash, permanent=False)
         else:
-            return super().get(request)
+            return conditional_response(
+                request,
+                partial(super().get, request),
+                etag_parts=("height", height, [
+                    (blk.hash, blk.total_difficulty) for blk in self.blocks]),
+                # blocks may still be imported at a height without any
+                height=height if self.blocks else None,
+                last_modified=max((blk.timestamp for blk in self.blocks), default=None),
+            )
 
 
 class Search(TemplateView):
     template_name = "explorer/search_results.html"
     results = None
+    kernels = None
     q_isdigit = False
 
     def get_context_data(self, **kwargs):
@@ -260,33 +419,52 @@ class Search(TemplateView):
         context["q"] = self.q
         context["q_isdigit"] = self.q_isdigit
         context["results"] = self.results
+        context["kernels"] = self.kernels
 
         return context
 
     def get(self, request):
         self.q = request.GET.get("q", "").strip()
 
-        # search query is valid block height
-        if self.q.isdigit():
-            self.q_isdigit = True
-
-            if Block.objects.filter(height=self.q).count():
-                return redirect("blocks-by-height", height=self.q, permanent=False)
+        # redirect straight to the page of what has been found, so it's
+        # only looked up once more by its primary key
+        url = self.resolve()
+        if url is not None:
+            return redirect(url, permanent=False)
 
-        # commitment are 66 characters long
-        if len(self.q) == 66:
-            self.results = Output.objects.filter(
-                commit=self.q).order_by("-id")
-
-            # if only one result, redirect to commit detail
-            if self.results.count() != 0:
-                return redirect("output-detail", commit=self.results[0].commit, permanent=False)
-
-        if len(self.q) > 6:
-            self.results = Block.objects.filter(hash__startswith=self.q)
+        return super().get(request)
 
-            # if only one result, redirect to found block
-            if self.results.count() == 1:
-                return redirect("block-detail", pk=self.results[0].hash, permanent=False)
+    def resolve(self):
+        # Looks up the query with at most one query for each kind of object
+        # it may refer to and returns the URL of the object found, if there
+        # is a single one
+        if self.q.isdigit() and int(self.q) <= MAX_HEIGHT:
+            self.q_isdigit = True
 
-        return super().get(request)
+            # the block at this height, or whether there are several
+            hashes = Block.objects.filter(height=self.q) \
+                                  .values_list("hash", flat=True)[:2]
+            if len(hashes) == 1:
+                return reverse("block-detail", kwargs={"pk": hashes[0]})
+            if len(hashes) > 1:
+                return reverse("blocks-by-height", kwargs={"height": self.q})
+
+        # commitments and kernel excesses are 66 characters long
+        if len(self.q) == 66 and is_hex(self.q):
+            if Output.objects.filter(commit=self.q).exists():
+                return reverse("output-detail", kwargs={"commit": self.q.lower()})
+            if Kernel.objects.filter(excess=self.q).exists():
+                return reverse("kernel-detail", kwargs={"excess": self.q.lower()})
+
+        if len(self.q) > 6 and is_hex(self.q, prefix=True):
+            self.results = list(Block.objects.filter(hash__startswith=self.q))
+            self.kernels = list(Kernel.objects.filter(excess__startswith=self.q)
+                                              .select_related("block")[:MAX_KERNEL_RESULTS])
+
+            # if only one result, redirect to found block or kernel
+            if len(self.results) == 1 and not self.kernels:
+                return reverse("block-detail", kwargs={"pk": self.results[0].hash})
+            if len(self.kernels) == 1 and not self.results:
+                return reverse("kernel-detail", kwargs={"excess": self.kernels[0].excess})
+
+        return None
@@ -62,6 +62,7 @@ MIDDLEWARE = [
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    "explorer.replicas.ReplicaMiddleware",
 ]
 
 ROOT_URLCONF = "grinexplorer.urls"
@@ -99,6 +100,71 @@ DATABASES = {
     }
 }
 
+# Optional read replicas of the database, given as DB_REPLICAS=host[:port],...
+# with the same name and credentials. The pages are read from a replica that's
+# at most EXPLORER_REPLICA_MAX_LAG seconds behind, or from the primary if there
+# is none, while the importer always uses the primary.
+
+EXPLORER_REPLICAS = []
+
+for (i, replica) in enumerate(filter(None, os.environ.get("DB_REPLICAS", "").split(","))):
+    (host, _, port) = replica.strip().partition(":")
+    alias = "replica%d" % i
+    DATABASES[alias] = dict(DATABASES["default"], HOST=host,
+                            PORT=port or DATABASES["default"]["PORT"],
+                            TEST={"MIRROR": "default"})
+    EXPLORER_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ["explorer.replicas.ReplicaRouter"]
+
+EXPLORER_REPLICA_MAX_LAG = float(os.environ.get("REPLICA_MAX_LAG", 5))
+
+# seconds between checks of the lag of each replica
+EXPLORER_REPLICA_CHECK_INTERVAL = 5
+
+
+# Cache
+# https://docs.djangoproject.com/en/2.0/topics/cache/
+#
+# Set CACHE_DIR to share the cache between the web workers and the importer,
+# which lets the importer invalidate cached pages as soon as it stores new
+# blocks.
+
+if os.environ.get("CACHE_DIR"):
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+            "LOCATION": os.environ["CACHE_DIR"],
+            "OPTIONS": {"MAX_ENTRIES": 100000},
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "OPTIONS": {"MAX_ENTRIES": 10000},
+        }
+    }
+
+# seconds the current tip is cached for if the importer can't invalidate it
+EXPLORER_TIP_CACHE_TIMEOUT = 5
+
+# seconds the dashboard statistics of a tip are cached for
+EXPLORER_DASHBOARD_CACHE_TIMEOUT = 3600
+
+# the importer renders the cached parts of the pages of new blocks this close
+# to the tip
+EXPLORER_WARM_DEPTH = 20
+
+# blocks this far below the tip are considered final, so the pages about them
+# are cached by browsers and proxies for EXPLORER_CONFIRMED_MAX_AGE seconds
+# and all other pages for EXPLORER_UNCONFIRMED_MAX_AGE seconds
+EXPLORER_CONFIRMATION_DEPTH = int(os.environ.get("CONFIRMATION_DEPTH", 1440))
+
+EXPLORER_CONFIRMED_MAX_AGE = 7 * 24 * 3600
+
+EXPLORER_UNCONFIRMED_MAX_AGE = 30
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.0/ref/settings/#auth-password-validators